@@ -0,0 +1,146 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from causallearn.search.ConstraintBased.PC import pc
+from data_preparation import load_and_prepare_student_data, load_and_prepare_adult_data
+from pc_algorithm import prepare_ci_test
+from lingam_algorithm import GramPrunedICALiNGAM
+from direct_lingam import GramPrunedDirectLiNGAM, pwling_causal_order, estimate_adjacency_matrix
+from effect_estimation import bootstrap_effects
+
+DTYPES = {'float64': np.float64, 'float32': np.float32}
+
+def synthetic_data(n_samples=200000, n_features=20, edge_prob=0.2, random_state=0):
+    """
+    Linear non-Gaussian SEM data over a random DAG, large enough for memory bandwidth to matter.
+
+    Returns:
+        pd.DataFrame: Samples with columns x0..x{n_features - 1} in causal order.
+    """
+    rng = np.random.default_rng(random_state)
+    B = np.tril(rng.uniform(0.5, 1.5, (n_features, n_features)) * rng.choice([-1, 1], (n_features, n_features)), -1)
+    B *= rng.random((n_features, n_features)) < edge_prob
+    X = rng.uniform(-1, 1, (n_samples, n_features))
+    for i in range(n_features):
+        X[:, i] += X @ B[i]
+    return pd.DataFrame(X, columns=[f'x{i}' for i in range(n_features)])
+
+def _pc_edges(data, dtype, alpha=0.05):
+    test_data, indep_test, test_kwargs = prepare_ci_test(data, dtype=dtype)
+    graph = pc(test_data, alpha=alpha, indep_test=indep_test, show_progress=False, **test_kwargs).G.graph
+    # graph[j, i] == 1 and graph[i, j] == -1 is i -> j; an undirected edge counts in both directions
+    return np.argwhere(((graph.T == 1) & (graph == -1)) | ((graph == -1) & (graph.T == -1))), None
+
+def _lingam_edges(model, data, dtype):
+    model.fit(np.asarray(data, dtype=dtype))
+    B = model.adjacency_matrix_
+    return np.argwhere(B.T != 0), B
+
+def _pwling_edges(data, dtype):
+    X = np.asarray(data, dtype=dtype)
+    B = estimate_adjacency_matrix(X, pwling_causal_order(X))
+    return np.argwhere(B.T != 0), B
+
+ALGORITHMS = {
+    'PC (fisherz)': _pc_edges,
+    'ICA-LiNGAM': lambda data, dtype: _lingam_edges(GramPrunedICALiNGAM(random_state=0, max_iter=500), data, dtype),
+    'DirectLiNGAM': lambda data, dtype: _lingam_edges(GramPrunedDirectLiNGAM(), data, dtype),
+    'DirectLiNGAM (pwling order)': _pwling_edges,
+}
+
+def _timed(func, repeats):
+    """Result of func() and the best wall-clock time over repeats runs."""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def compare_discovery(data, algorithms=None, repeats=3):
+    """
+    Run each algorithm in float64 and float32 and compare speed and graph agreement.
+
+    Returns:
+        pd.DataFrame: One row per algorithm with both timings, the speedup, the number of edges
+            found by each precision, the edges found by only one of them, the Jaccard agreement of
+            the edge sets and the largest absolute difference of the edge weights.
+    """
+    rows = []
+    for name, func in (algorithms or ALGORITHMS).items():
+        print(f"Benchmarking {name}...")
+        (edges64, B64), time64 = _timed(lambda: func(data, np.float64), repeats)
+        (edges32, B32), time32 = _timed(lambda: func(data, np.float32), repeats)
+        set64, set32 = set(map(tuple, edges64)), set(map(tuple, edges32))
+        union = set64 | set32
+        rows.append({
+            'algorithm': name,
+            'float64_s': time64,
+            'float32_s': time32,
+            'speedup': time64 / time32,
+            'edges_float64': len(set64),
+            'edges_float32': len(set32),
+            'edges_differing': len(set64 ^ set32),
+            'jaccard': len(set64 & set32) / len(union) if union else 1.0,
+            'max_weight_diff': np.nan if B64 is None else float(np.max(np.abs(B64 - B32))),
+        })
+    return pd.DataFrame(rows)
+
+def compare_bootstrap(df, treatment, outcome, n_bootstrap=200, n_jobs=None):
+    """Bootstrap effect intervals in both precisions: timings and the largest difference of any estimate or bound."""
+    covariates = [c for c in df.columns if c not in (treatment, outcome)]
+    results, times = {}, {}
+    for name, dtype in DTYPES.items():
+        print(f"Bootstrapping {treatment} -> {outcome} in {name}...")
+        results[name], times[name] = _timed(lambda: bootstrap_effects(df, treatment, outcome, covariates,
+                                                                      n_bootstrap=n_bootstrap, n_jobs=n_jobs,
+                                                                      dtype=dtype), 1)
+    return pd.DataFrame([{
+        'algorithm': f'bootstrap {treatment} -> {outcome}',
+        'float64_s': times['float64'],
+        'float32_s': times['float32'],
+        'speedup': times['float64'] / times['float32'],
+        'max_estimate_diff': float(np.max(np.abs(results['float64'].to_numpy() - results['float32'].to_numpy()))),
+    }])
+
+def main(dataset, repeats=3, n_samples=200000, n_features=20, n_bootstrap=200, n_jobs=None, output_file=None):
+    if dataset == 'student':
+        df_encoded, labels, data = load_and_prepare_student_data('data/student-por_raw.csv')
+        pair = ('absences', 'G_avg')
+    elif dataset == 'adult':
+        df_encoded, labels, data = load_and_prepare_adult_data('data/adult_cleaned.csv')
+        pair = ('hours.per.week', 'income')
+    elif dataset == 'synthetic':
+        df_encoded = synthetic_data(n_samples=n_samples, n_features=n_features)
+        data = df_encoded.to_numpy()
+        pair = None
+    else:
+        raise ValueError("Invalid dataset. Choose 'student', 'adult' or 'synthetic'.")
+
+    print(f"Comparing float32 with float64 on {dataset} data of shape {data.shape}")
+    results = compare_discovery(data, repeats=repeats)
+    if pair and n_bootstrap:
+        results = pd.concat([results, compare_bootstrap(df_encoded, *pair, n_bootstrap=n_bootstrap, n_jobs=n_jobs)],
+                            ignore_index=True)
+
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(results.to_string(index=False, float_format=lambda value: f'{value:.4g}'))
+    if output_file:
+        results.to_csv(output_file, index=False)
+        print(f"Benchmark results saved at: {output_file}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare speed and graph agreement of the float32 and float64 compute modes.')
+    parser.add_argument('--dataset', required=True, choices=['student', 'adult', 'synthetic'], help='Dataset to benchmark on')
+    parser.add_argument('--repeats', type=int, default=3, help='Runs per algorithm and precision; the best time is reported')
+    parser.add_argument('--n_samples', type=int, default=200000, help='Rows of the synthetic dataset')
+    parser.add_argument('--n_features', type=int, default=20, help='Columns of the synthetic dataset')
+    parser.add_argument('--n_bootstrap', type=int, default=200, help='Bootstrap resamples for the effect comparison (0 to skip)')
+    parser.add_argument('--n_jobs', type=int, default=None, help='Worker processes for the bootstrap')
+    parser.add_argument('--output', default=None, help='CSV file for the results table')
+    args = parser.parse_args()
+
+    main(args.dataset, repeats=args.repeats, n_samples=args.n_samples, n_features=args.n_features,
+         n_bootstrap=args.n_bootstrap, n_jobs=args.n_jobs, output_file=args.output)
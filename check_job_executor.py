@@ -0,0 +1,92 @@
+import os
+import sys
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from job_executor import SharedDirectoryExecutor, STOP_FILE
+
+MARKERS = 'markers'
+
+def slow_square(queue_dir, x, delay):
+    """Job run on the workers: record which worker started it, wait, and return (x * x, worker pid)."""
+    open(os.path.join(queue_dir, MARKERS, f'{x}-{os.getpid()}'), 'w').close()
+    time.sleep(delay)
+    return x * x, os.getpid()
+
+def _started(queue_dir):
+    """(job, worker pid) pairs of every job start recorded so far."""
+    return [tuple(int(part) for part in name.split('-')) for name in os.listdir(os.path.join(queue_dir, MARKERS))]
+
+def _kill_first_busy_worker(queue_dir, workers, killed, timeout=60.0):
+    """SIGKILL the worker that started the first job, while that job is still running."""
+    pids = {worker.pid for worker in workers}
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for x, pid in _started(queue_dir):
+            if pid in pids:
+                os.kill(pid, signal.SIGKILL)
+                killed.update(job=x, pid=pid)
+                print(f"Killed worker {pid} while it was running job {x}")
+                return
+        time.sleep(0.05)
+
+def check_requeue(n_workers=3, n_jobs=12, delay=1.0, queue_dir=None):
+    """
+    Start n_workers workers on a queue directory, kill one mid-job and check that every result returns.
+
+    Args:
+        n_workers (int): Number of worker processes (at least 2, so one survives the kill).
+        n_jobs (int): Number of jobs to submit.
+        delay (float): Seconds each job runs; must be well above the heartbeat interval.
+        queue_dir (str, optional): Queue directory to use (defaults to a new temporary directory).
+
+    Returns:
+        dict: The killed worker's pid and the job it was running.
+    """
+    own_dir = queue_dir is None
+    queue_dir = queue_dir or tempfile.mkdtemp(prefix='job_queue_')
+    os.makedirs(os.path.join(queue_dir, MARKERS), exist_ok=True)
+    here = os.path.dirname(os.path.abspath(__file__))
+    worker_cmd = [sys.executable, os.path.join(here, 'job_executor.py'), queue_dir,
+                  '--heartbeat', '0.2', '--stale_after', '2', '--idle_timeout', '60']
+    workers = [subprocess.Popen(worker_cmd, stdout=subprocess.DEVNULL) for _ in range(n_workers)]
+    try:
+        killed = {}
+        killer = threading.Thread(target=_kill_first_busy_worker, args=(queue_dir, workers, killed))
+        killer.start()
+        executor = SharedDirectoryExecutor(queue_dir, poll_interval=0.1, stale_after=2.0, timeout=120)
+        results = executor.map(slow_square, [queue_dir] * n_jobs, range(n_jobs), [delay] * n_jobs)
+        killer.join()
+
+        assert killed, "No worker was killed; the jobs finished before any start was recorded"
+        assert [value for value, _ in results] == [x * x for x in range(n_jobs)], f"Wrong results: {results}"
+        assert results[killed['job']][1] != killed['pid'], "The killed worker's job has no result from another worker"
+        restarts = [pid for x, pid in _started(queue_dir) if x == killed['job']]
+        assert len(restarts) >= 2, f"Job {killed['job']} was not requeued (started by {restarts})"
+        assert workers[[w.pid for w in workers].index(killed['pid'])].wait(timeout=10) == -signal.SIGKILL
+        print(f"All {n_jobs} results returned; job {killed['job']} was requeued and finished by worker "
+              f"{results[killed['job']][1]}")
+        return killed
+    finally:
+        open(os.path.join(queue_dir, STOP_FILE), 'w').close()
+        for worker in workers:
+            try:
+                worker.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                worker.kill()
+        if own_dir:
+            shutil.rmtree(queue_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that SharedDirectoryExecutor survives a worker killed mid-job.')
+    parser.add_argument('--workers', type=int, default=3, help='Number of worker processes')
+    parser.add_argument('--jobs', type=int, default=12, help='Number of jobs to submit')
+    parser.add_argument('--delay', type=float, default=1.0, help='Seconds each job runs')
+    parser.add_argument('--queue_dir', default=None, help='Queue directory (defaults to a temporary directory)')
+    args = parser.parse_args()
+
+    check_requeue(n_workers=args.workers, n_jobs=args.jobs, delay=args.delay, queue_dir=args.queue_dir)
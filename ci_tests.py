@@ -0,0 +1,185 @@
+import numpy as np
+from collections import OrderedDict
+from math import sqrt, log
+from scipy.stats import norm
+from scipy.special import chdtrc
+from causallearn.utils.cit import CIT_Base, register_ci_test
+from data_preparation import correlation_matrix as float64_correlation
+
+shared_fisherz = "shared_fisherz"
+fast_gsq = "fast_gsq"
+fast_chisq = "fast_chisq"
+
+class SharedFisherZ(CIT_Base):
+    """
+    Fisher-z test that reads a precomputed correlation matrix instead of recomputing it.
+
+    Pass the matrix through pc's keyword arguments, e.g.
+    pc(data, indep_test=shared_fisherz, correlation_matrix=corr). Without one, float32 data is
+    correlated with float64 accumulation (data_preparation.correlation_matrix).
+    """
+
+    def __init__(self, data, correlation_matrix=None, **kwargs):
+        super().__init__(data, **kwargs)
+        self.check_cache_method_consistent(shared_fisherz, 'NO SPECIFIED PARAMETERS')
+        if correlation_matrix is None:
+            correlation_matrix = float64_correlation(data) if data.dtype == np.float32 else np.corrcoef(data.T)
+        self.correlation_matrix = correlation_matrix
+
+    def __call__(self, X, Y, condition_set=None):
+        Xs, Ys, condition_set, cache_key = self.get_formatted_XYZ_and_cachekey(X, Y, condition_set)
+        if cache_key in self.pvalue_cache:
+            return self.pvalue_cache[cache_key]
+        var = Xs + Ys + condition_set
+        try:
+            inv = np.linalg.inv(self.correlation_matrix[np.ix_(var, var)])
+        except np.linalg.LinAlgError:
+            raise ValueError('Data correlation matrix is singular. Cannot run fisherz test. Please check your data.')
+        r = -inv[0, 1] / sqrt(abs(inv[0, 0] * inv[1, 1]))
+        if abs(r) >= 1:
+            r = (1. - np.finfo(float).eps) * np.sign(r)
+        z = 0.5 * log((1 + r) / (1 - r))
+        statistic = sqrt(self.sample_size - len(condition_set) - 3) * abs(z)
+        p = 2 * (1 - norm.cdf(statistic))
+        self.pvalue_cache[cache_key] = p
+        return p
+
+def _dense_ids(raw, size, sample_size, return_ids=True):
+    """
+    Map packed codes in [0, size) to dense ids of the occupied values.
+
+    Returns:
+        tuple: (dense id per entry of raw, or None; count of each occupied value; the occupied
+        values in increasing order).
+    """
+    if size <= 4 * sample_size:
+        counts = np.bincount(raw, minlength=size)
+        values = np.flatnonzero(counts > 0)
+        ids = None
+        if return_ids:
+            lookup = np.empty(size, dtype=np.int64)
+            lookup[values] = np.arange(len(values))
+            ids = lookup[raw]
+        return ids, counts[values], values
+    if not return_ids:
+        values, counts = np.unique(raw, return_counts=True)
+        return None, counts, values
+    values, ids, counts = np.unique(raw, return_inverse=True, return_counts=True)
+    return ids.ravel(), counts, values
+
+def _xlogx_sum(counts):
+    return np.sum(counts * np.log(counts))
+
+class DiscreteCITest(CIT_Base):
+    """
+    G-square / chi-square tests for categorical data using packed-code contingency counting.
+
+    Each column is re-coded once to dense category codes. For a test of X, Y given S, the codes of
+    S are packed into a single stratum id per row. Stratum ids and counts are built from those of
+    the set minus its last variable and kept in an LRU cache, so conditioning sets shared between
+    tests are packed once; the (S, X) strata are the cached strata of S + {X}. The (S, X, Y) table
+    is counted over its occupied cells with one bincount, and the (S, Y) marginal, both statistics
+    and the degrees of freedom are computed from those cells rather than per row. Degrees of freedom
+    drop empty rows and columns per stratum, matching causallearn's chisq/gsq tests.
+
+    Args:
+        data (np.ndarray): Data of category codes, shape (n_samples, n_features).
+        max_cached_sets (int): Number of conditioning sets whose stratum ids are cached.
+    """
+    G_sq = True
+    method_name = fast_gsq
+
+    def __init__(self, data, max_cached_sets=4096, **kwargs):
+        super().__init__(data, **kwargs)
+        self.check_cache_method_consistent(self.method_name, 'NO SPECIFIED PARAMETERS')
+        self.assert_input_data_is_valid()
+        self.codes = []
+        self.cardinalities = []
+        for j in range(self.num_features):
+            uniques, inverse = np.unique(data[:, j], return_inverse=True)
+            self.codes.append(np.ascontiguousarray(inverse.ravel(), dtype=np.int64))
+            self.cardinalities.append(len(uniques))
+        self.max_cached_sets = max_cached_sets
+        self._strata = OrderedDict()
+        self._no_strata = (np.zeros(self.sample_size, dtype=np.int64), np.array([self.sample_size]))
+        # Reused for the packed codes of each table, which are only needed until they are counted
+        self._packed = np.empty(self.sample_size, dtype=np.int64)
+
+    def _pack(self, ids, card, variable):
+        """Packed codes ids * card + codes of variable, written into the shared scratch buffer."""
+        np.multiply(ids, card, out=self._packed)
+        return np.add(self._packed, self.codes[variable], out=self._packed)
+
+    def __getstate__(self):
+        # causallearn deep-copies the causal graph, and with it this test, after the skeleton phase;
+        # copies start with an empty stratum cache instead of duplicating it
+        state = self.__dict__.copy()
+        state['_strata'] = OrderedDict()
+        return state
+
+    def _stratum_ids(self, condition_set):
+        """Dense stratum id per row for a sorted conditioning set, and the row count of each stratum."""
+        key = tuple(condition_set)
+        if not key:
+            return self._no_strata
+        if key in self._strata:
+            self._strata.move_to_end(key)
+            return self._strata[key]
+
+        prefix_ids, prefix_counts = self._stratum_ids(key[:-1])
+        card = self.cardinalities[key[-1]]
+        strata = _dense_ids(self._pack(prefix_ids, card, key[-1]), len(prefix_counts) * card, self.sample_size)[:2]
+
+        self._strata[key] = strata
+        if len(self._strata) > self.max_cached_sets:
+            self._strata.popitem(last=False)
+        return strata
+
+    def __call__(self, X, Y, condition_set=None):
+        Xs, Ys, condition_set, cache_key = self.get_formatted_XYZ_and_cachekey(X, Y, condition_set)
+        if cache_key in self.pvalue_cache:
+            return self.pvalue_cache[cache_key]
+        x, y = Xs[0], Ys[0]
+        if self.cardinalities[y] > self.cardinalities[x]:
+            # Both statistics are symmetric; refining S by the larger variable keeps the (S, X, Y) codes small
+            x, y = y, x
+        n = self.sample_size
+        card_y = self.cardinalities[y]
+        s_ids, n_s = self._stratum_ids(condition_set)
+        # S + {X} is packed in sorted order so it is shared with conditioning sets of other tests
+        sx_ids, n_sx = self._stratum_ids(sorted(condition_set + [x]))
+        s_of_sx = np.empty(len(n_sx), dtype=np.int64)
+        s_of_sx[sx_ids] = s_ids
+
+        # Occupied (S, X, Y) cells; from here on everything is per cell, not per row
+        _, n_sxy, cells = _dense_ids(self._pack(sx_ids, card_y, y), len(n_sx) * card_y, n, return_ids=False)
+        sx_of_cell = cells // card_y
+        s_of_cell = s_of_sx[sx_of_cell]
+        sy_of_cell, _, sy_values = _dense_ids(s_of_cell * card_y + cells % card_y, len(n_s) * card_y, len(cells))
+        n_sy = np.bincount(sy_of_cell, weights=n_sxy)
+
+        if self.G_sq:
+            # 2 * sum O log(O / E) with E = n_sx * n_sy / n_s, expanded over the occupied cells of each table
+            statistic = 2 * (_xlogx_sum(n_sxy) + _xlogx_sum(n_s) - _xlogx_sum(n_sx) - _xlogx_sum(n_sy))
+        else:
+            # sum (O - E)^2 / E = sum O^2 / E - n, and O^2 / E is zero on empty cells
+            statistic = np.sum(n_sxy * (n_sxy * n_s[s_of_cell] / (n_sx[sx_of_cell] * n_sy[sy_of_cell]))) - n
+        statistic = max(statistic, 0.0)
+
+        # Per stratum, (occupied X values - 1) * (occupied Y values - 1)
+        rows_x = np.bincount(s_of_sx, minlength=len(n_s))
+        rows_y = np.bincount(sy_values // card_y, minlength=len(n_s))
+        dof = np.sum((rows_x - 1) * (rows_y - 1))
+
+        p = 1 if dof <= 0 else chdtrc(dof, statistic)
+        self.pvalue_cache[cache_key] = p
+        return p
+
+class DiscreteChiSquare(DiscreteCITest):
+    """Chi-square variant of DiscreteCITest."""
+    G_sq = False
+    method_name = fast_chisq
+
+register_ci_test(shared_fisherz, SharedFisherZ)
+register_ci_test(fast_gsq, DiscreteCITest)
+register_ci_test(fast_chisq, DiscreteChiSquare)
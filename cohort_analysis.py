@@ -1,58 +1,53 @@
 import os
-import json
-import numpy as np
 import pandas as pd
 from sklearn.linear_model import LogisticRegression
 from causallib.estimation import IPW
 from causalvis import CohortEvaluator, TreatmentEffectExplorer
-from data_preparation import load_and_prepare_student_data
+from data_preparation import load_and_prepare_student_data, apply_variable_mapping, student_variable_mapping
 from matching import perform_matching
 from dag_utils import load_dag  # Import the dag_utils module
+from cohort_export import cohort_to_columns, add_effect, columns_to_records, export_cohort
+from effect_estimation import bootstrap_effects
 
-def convert_types(data):
-    """ Convert numpy data types to native Python types for JSON serialization. """
-    if isinstance(data, dict):
-        return {k: convert_types(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [convert_types(i) for i in data]
-    elif isinstance(data, (np.int32, np.int64)):
-        return int(data)
-    elif isinstance(data, (np.float32, np.float64)):
-        return float(data)
-    else:
-        return data
-
-def main(data_file, dag_file):
+def main(data_file, dag_file, binary=False, n_bootstrap=0):
     # Load and prepare data
     df_encoded, labels, data = load_and_prepare_student_data(data_file)
     
-    # Load DAG and extract confounds and prognostics
-    G, confounds, prognostics = load_dag(dag_file)
+    treatment = 'absences'
+    outcome = 'G_avg'
+
+    # Load DAG and derive confounds and prognostics for the treatment/outcome pair
+    G, confounds, prognostics = load_dag(dag_file, treatment, outcome)
     
     # Check confounds and prognostics
     print("Confounds: ", confounds)
     print("Prognostics: ", prognostics)
-    
-    treatment = 'absences'
-    outcome = 'G_avg'
+
+    # Bootstrap confidence intervals for the IPW and matching effects
+    if n_bootstrap:
+        covariates = apply_variable_mapping(confounds + prognostics, student_variable_mapping)
+        print(bootstrap_effects(df_encoded, treatment, outcome, covariates, n_bootstrap=n_bootstrap))
 
     # Perform matching
     adjustedCohort, unadjustedCohort = perform_matching(df_encoded, confounds, prognostics, treatment, outcome)
 
-    # Convert data types
-    adjustedCohort = convert_types(adjustedCohort)
-    unadjustedCohort = convert_types(unadjustedCohort)
+    # Keep cohorts columnar until serialization
+    adjusted_columns = cohort_to_columns(adjustedCohort)
+    unadjusted_columns = cohort_to_columns(unadjustedCohort)
 
     # Generate file names based on the DAG file name
     base_name = os.path.splitext(os.path.basename(dag_file))[0]
     adjusted_file_name = f'adjustedCohort_{base_name}.json'
     unadjusted_file_name = f'unadjustedCohort_{base_name}.json'
 
-    # Save cohorts for visualization
-    with open(adjusted_file_name, 'w') as f:
-        json.dump(adjustedCohort, f, indent=4)
-    with open(unadjusted_file_name, 'w') as f:
-        json.dump(unadjustedCohort, f, indent=4)
+    # Stream cohorts to disk for visualization
+    export_cohort(adjusted_columns, adjusted_file_name, binary=binary)
+    export_cohort(unadjusted_columns, unadjusted_file_name, binary=binary)
+
+    # The causalvis widgets take per-row records of native Python types; the effect is
+    # derived once for the whole adjusted cohort and kept out of the exported JSON
+    adjustedCohort = columns_to_records(add_effect(adjusted_columns))
+    unadjustedCohort = columns_to_records(unadjusted_columns)
 
     # Instantiate and visualize using CohortEvaluator
     cohort_evaluator = CohortEvaluator(unadjustedCohort=unadjustedCohort)
@@ -62,10 +57,6 @@ def main(data_file, dag_file):
     print(cohort_evaluator.selection["confounds"][:3])
     print(cohort_evaluator.iselection["confounds"][:3])
 
-    # Prepare data for TreatmentEffectExplorer
-    for instance in adjustedCohort:
-        instance['effect'] = instance['treatment'] - np.mean([x['outcome'] for x in adjustedCohort])
-
     # Instantiate and visualize using TreatmentEffectExplorer
     te_explorer = TreatmentEffectExplorer(data=adjustedCohort)
     display(te_explorer)
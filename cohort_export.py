@@ -0,0 +1,132 @@
+import os
+import json
+import itertools
+import numpy as np
+import pandas as pd
+
+def cohort_to_columns(cohort):
+    """
+    Convert a cohort into a columnar mapping of NumPy arrays.
+
+    Args:
+        cohort (list | pd.DataFrame | dict): Cohort as a list of per-row dicts (as returned by
+            perform_matching), a DataFrame, or an existing mapping of column name to array.
+
+    Returns:
+        dict: Mapping of column name to a 1-D NumPy array, in column order.
+    """
+    if isinstance(cohort, dict):
+        return {name: np.asarray(values) for name, values in cohort.items()}
+    if not isinstance(cohort, pd.DataFrame):
+        cohort = pd.DataFrame.from_records(cohort)
+    return {name: cohort[name].to_numpy() for name in cohort.columns}
+
+def add_effect(columns, treatment_col='treatment', outcome_col='outcome'):
+    """
+    Add the per-instance 'effect' column used by TreatmentEffectExplorer.
+
+    The effect of each instance is its treatment value minus the mean outcome of the cohort,
+    computed once for the whole cohort instead of once per instance.
+
+    Args:
+        columns (dict): Columnar cohort as returned by cohort_to_columns.
+        treatment_col (str): Name of the treatment column.
+        outcome_col (str): Name of the outcome column.
+
+    Returns:
+        dict: The same mapping with an 'effect' column added.
+    """
+    outcome_mean = np.mean(columns[outcome_col], dtype=np.float64)
+    columns['effect'] = columns[treatment_col].astype(np.float64) - outcome_mean
+    return columns
+
+def iter_records(columns, chunk_size=10000):
+    """
+    Yield the cohort as per-row dicts of native Python types, one chunk at a time.
+
+    Args:
+        columns (dict): Columnar cohort as returned by cohort_to_columns.
+        chunk_size (int): Number of rows converted per chunk.
+
+    Yields:
+        dict: One record per cohort row.
+    """
+    names = list(columns)
+    n_rows = len(next(iter(columns.values()))) if names else 0
+    for start in range(0, n_rows, chunk_size):
+        stop = min(start + chunk_size, n_rows)
+        # tolist() converts NumPy scalars to native Python types in C
+        chunk = [columns[name][start:stop].tolist() for name in names]
+        for row in zip(*chunk):
+            yield dict(zip(names, row))
+
+def columns_to_records(columns):
+    """Materialise a columnar cohort as a list of per-row dicts (e.g. for causalvis widgets)."""
+    return list(iter_records(columns))
+
+def write_cohort_json(columns, filename, chunk_size=10000):
+    """
+    Stream a columnar cohort to disk as a compact JSON array of records.
+
+    Only one chunk of rows is converted to Python objects at a time, so memory stays bounded
+    regardless of cohort size.
+
+    Args:
+        columns (dict): Columnar cohort as returned by cohort_to_columns.
+        filename (str): Path of the JSON file to write.
+        chunk_size (int): Number of rows converted per chunk.
+    """
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    records = iter_records(columns, chunk_size=chunk_size)
+    with open(filename, 'w') as f:
+        f.write('[')
+        separator = ''
+        while True:
+            # Encode one chunk of records and write it with a single call
+            chunk = [encode(record) for record in itertools.islice(records, chunk_size)]
+            if not chunk:
+                break
+            f.write(separator + ','.join(chunk))
+            separator = ','
+        f.write(']')
+
+def write_cohort_npz(columns, filename):
+    """
+    Write a columnar cohort as a binary .npz sidecar (one array per column).
+
+    Args:
+        columns (dict): Columnar cohort as returned by cohort_to_columns.
+        filename (str): Path of the .npz file to write.
+    """
+    arrays = {}
+    for name, values in columns.items():
+        # Object columns (e.g. strings) are stored as fixed-width unicode so no pickling is needed
+        arrays[name] = values.astype(str) if values.dtype == object else values
+    np.savez(filename, **arrays)
+
+def load_cohort_npz(filename):
+    """Load a binary cohort sidecar written by write_cohort_npz back into columnar form."""
+    with np.load(filename, allow_pickle=False) as npz:
+        return {name: npz[name] for name in npz.files}
+
+def export_cohort(cohort, filename, with_effect=False, binary=False, chunk_size=10000):
+    """
+    Export a cohort to disk, keeping it columnar until serialization.
+
+    Args:
+        cohort (list | pd.DataFrame | dict): Cohort to export (see cohort_to_columns).
+        filename (str): Path of the JSON file to write.
+        with_effect (bool): Whether to add the derived 'effect' column before writing.
+        binary (bool): Whether to also write a .npz sidecar next to the JSON file.
+        chunk_size (int): Number of rows converted per chunk when streaming JSON.
+
+    Returns:
+        dict: The columnar cohort that was written.
+    """
+    columns = cohort_to_columns(cohort)
+    if with_effect:
+        add_effect(columns)
+    write_cohort_json(columns, filename, chunk_size=chunk_size)
+    if binary:
+        write_cohort_npz(columns, f'{os.path.splitext(filename)[0]}.npz')
+    return columns
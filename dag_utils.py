@@ -1,17 +1,214 @@
+import os
 import json
+import functools
 import networkx as nx
 
-def load_dag(dag_file):
-    with open(dag_file, 'r') as f:
+def _bits(mask):
+    """Yield the indices of the set bits of an integer bitset in increasing order."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class CompiledDAG:
+    """
+    A DAG compiled to an integer index with parent/child and ancestor/descendant bitsets.
+
+    Node i is represented by bit i of a Python int, so role and adjacency queries for a
+    (treatment, outcome) pair reduce to a handful of bitwise operations.
+
+    Args:
+        graph (nx.DiGraph): The directed acyclic graph to compile.
+    """
+
+    def __init__(self, graph):
+        # Freeze a copy so the caller's graph stays editable
+        self.graph = nx.freeze(nx.DiGraph(graph))
+        self.nodes = list(graph.nodes())
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        # Per-pair results, kept on the instance so they are freed with it
+        self._role_cache = {}
+        self._backdoor_cache = {}
+
+        n = len(self.nodes)
+        self.parents = [0] * n
+        self.children = [0] * n
+        for u, v in graph.edges():
+            self.parents[self.index[v]] |= 1 << self.index[u]
+            self.children[self.index[u]] |= 1 << self.index[v]
+
+        # Raises NetworkXUnfeasible if the graph contains a cycle
+        order = [self.index[node] for node in nx.topological_sort(graph)]
+        self.ancestors = [0] * n
+        for i in order:
+            for p in _bits(self.parents[i]):
+                self.ancestors[i] |= self.ancestors[p] | (1 << p)
+        self.descendants = [0] * n
+        for i in reversed(order):
+            for c in _bits(self.children[i]):
+                self.descendants[i] |= self.descendants[c] | (1 << c)
+
+    def names(self, mask):
+        """Node names of the set bits of a bitset, in index order."""
+        return [self.nodes[i] for i in _bits(mask)]
+
+    def roles(self, treatment, outcome):
+        """
+        Classify variables relative to a (treatment, outcome) pair, as in causalvis.
+
+        Confounds are common ancestors of treatment and outcome, mediators lie on a directed path
+        from treatment to outcome, colliders are direct effects of both, and prognostics are direct
+        causes of the outcome that are neither ancestors nor descendants of the treatment.
+
+        Args:
+            treatment (str): Treatment variable.
+            outcome (str): Outcome variable.
+
+        Returns:
+            dict: Lists of node names under 'confounds', 'mediators', 'colliders' and 'prognostics'.
+        """
+        key = (treatment, outcome)
+        if key not in self._role_cache:
+            self._role_cache[key] = self._role_masks(treatment, outcome)
+        return {role: self.names(mask) for role, mask in self._role_cache[key].items()}
+
+    def _role_masks(self, treatment, outcome):
+        t, y = self.index[treatment], self.index[outcome]
+        pair = (1 << t) | (1 << y)
+        return {
+            'confounds': self.ancestors[t] & self.ancestors[y],
+            'mediators': self.descendants[t] & self.ancestors[y] & ~pair,
+            'colliders': self.children[t] & self.children[y],
+            'prognostics': self.parents[y] & ~(self.ancestors[t] | self.descendants[t] | pair),
+        }
+
+    def backdoor_set(self, treatment, outcome):
+        """
+        A minimal valid backdoor adjustment set for the effect of treatment on outcome.
+
+        Starts from all non-descendants of the treatment among the ancestors of the pair, which
+        d-separates treatment and outcome in the backdoor graph whenever any valid set exists, then
+        prunes it to the variables reachable from both ends in the moralized ancestral graph.
+
+        Args:
+            treatment (str): Treatment variable.
+            outcome (str): Outcome variable.
+
+        Returns:
+            list | None: Names of the adjustment variables, or None if no valid backdoor set exists.
+        """
+        key = (treatment, outcome)
+        if key not in self._backdoor_cache:
+            self._backdoor_cache[key] = self._backdoor_mask(treatment, outcome)
+        mask = self._backdoor_cache[key]
+        return None if mask is None else self.names(mask)
+
+    def _backdoor_mask(self, treatment, outcome):
+        t, y = self.index[treatment], self.index[outcome]
+        pair = (1 << t) | (1 << y)
+        relevant = self.ancestors[t] | self.ancestors[y] | pair
+        candidates = relevant & ~(self.descendants[t] | pair)
+
+        # Moral graph of the backdoor graph (edges out of the treatment removed) on the relevant nodes
+        neighbours = {i: 0 for i in _bits(relevant)}
+        for i in _bits(relevant):
+            parents = self.parents[i] & relevant & ~(1 << t)
+            for p in _bits(parents):
+                neighbours[p] |= parents | (1 << i)
+            neighbours[i] |= parents
+        for i in neighbours:
+            neighbours[i] &= ~(1 << i)
+
+        reached = self._reach(neighbours, t, candidates)
+        if reached >> y & 1:
+            return None
+        candidates &= reached
+        return candidates & self._reach(neighbours, y, candidates)
+
+    @staticmethod
+    def _reach(neighbours, start, blockers):
+        """Nodes reachable from start, expanding through nodes not in blockers (blockers are reached)."""
+        reached = 1 << start
+        frontier = reached
+        while frontier:
+            expand = 0
+            for i in _bits(frontier & ~blockers):
+                expand |= neighbours[i]
+            frontier = expand & ~reached
+            reached |= frontier
+        return reached
+
+    def causal_pairs(self):
+        """Yield every (treatment, outcome) pair joined by a directed path."""
+        for t, node in enumerate(self.nodes):
+            for y in _bits(self.descendants[t]):
+                yield node, self.nodes[y]
+
+    def adjustment_table(self, pairs=None):
+        """
+        Roles and minimal backdoor sets for many (treatment, outcome) pairs at once.
+
+        Args:
+            pairs (iterable, optional): Pairs to query; defaults to all causal_pairs().
+
+        Returns:
+            list: One dict per pair with 'treatment', 'outcome', the role lists and 'backdoor'.
+        """
+        if pairs is None:
+            pairs = self.causal_pairs()
+        return [
+            dict(treatment=t, outcome=y, **self.roles(t, y), backdoor=self.backdoor_set(t, y))
+            for t, y in pairs
+        ]
+
+@functools.lru_cache(maxsize=32)
+def _compile_dag_file(path, mtime):
+    with open(path, 'r') as f:
         dag_data = json.load(f)
     G = nx.DiGraph()
     for node in dag_data['nodes']:
         G.add_node(node['name'])
     for link in dag_data['links']:
         G.add_edge(link['source']['name'], link['target']['name'])
-    
-    # Directly extract confounds and prognostics
-    confounds = dag_data.get('confounds', [])
-    prognostics = dag_data.get('prognostics', [])
-    
-    return G, confounds, prognostics
\ No newline at end of file
+    return CompiledDAG(G), dag_data
+
+def compile_dag(dag_file):
+    """
+    Load a causalvis JSON DAG as a CompiledDAG, cached until the file changes.
+
+    Args:
+        dag_file (str): Path of the causalvis JSON file.
+
+    Returns:
+        tuple: (CompiledDAG, raw JSON dict). Both are shared between calls and must not be modified.
+    """
+    path = os.path.abspath(dag_file)
+    return _compile_dag_file(path, os.path.getmtime(path))
+
+def load_dag(dag_file, treatment=None, outcome=None):
+    """
+    Load a causalvis JSON DAG and the confounds and prognostics of its treatment/outcome pair.
+
+    The roles are derived from the graph structure for the given pair, defaulting to the
+    'treatment' and 'outcome' stored in the file. Files without a pair fall back to their
+    hand-entered 'confounds' and 'prognostics' fields.
+
+    Args:
+        dag_file (str): Path of the causalvis JSON file.
+        treatment (str, optional): Treatment variable.
+        outcome (str, optional): Outcome variable.
+
+    Returns:
+        tuple: (G, confounds, prognostics) where G is a frozen nx.DiGraph.
+    """
+    dag, dag_data = compile_dag(dag_file)
+    treatment = treatment or dag_data.get('treatment')
+    outcome = outcome or dag_data.get('outcome')
+    if treatment in dag.index and outcome in dag.index:
+        roles = dag.roles(treatment, outcome)
+        return dag.graph, roles['confounds'], roles['prognostics']
+
+    # Copy the lists so callers cannot modify the cached JSON
+    confounds = list(dag_data.get('confounds', []))
+    prognostics = list(dag_data.get('prognostics', []))
+    return dag.graph, confounds, prognostics
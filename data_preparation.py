@@ -1,7 +1,140 @@
 import pandas as pd
 import numpy as np
 
-def load_and_prepare_student_data(file_path):
+class DataMatrix(np.ndarray):
+    """
+    A single contiguous data buffer that records its column labels and kinds.
+
+    DataMatrix is an ndarray subclass, so it can be passed anywhere the loaders' plain arrays were
+    used; row slices are views that keep the metadata and column selections keep the labels of the
+    selected columns. Results that are no longer a samples-by-columns matrix (e.g. reductions)
+    carry no metadata. Column kinds are 'binary', 'ordinal' (integer valued) or 'continuous'.
+    """
+
+    def __new__(cls, values, labels, kinds):
+        obj = np.ascontiguousarray(values).view(cls)
+        obj.labels = list(labels)
+        obj.kinds = dict(kinds)
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.labels = getattr(obj, 'labels', None)
+        self.kinds = getattr(obj, 'kinds', None)
+        if self.labels is not None and (self.ndim != 2 or self.shape[1] != len(self.labels)):
+            self.labels = self.kinds = None
+
+    def __reduce__(self):
+        # ndarray pickles only the array; the metadata travels with it to executor and bootstrap workers
+        reconstruct, args, state = super().__reduce__()
+        return reconstruct, args, (state, self.labels, self.kinds)
+
+    def __setstate__(self, state):
+        state, self.labels, self.kinds = state
+        super().__setstate__(state)
+
+    def __getitem__(self, key):
+        result = super().__getitem__(key)
+        if (isinstance(result, DataMatrix) and self.labels is not None and result.ndim == 2
+                and isinstance(key, tuple) and len(key) == 2 and key[0] is not None and key[1] is not None):
+            # Subset the labels to the selected columns, in selection order
+            columns = np.arange(self.shape[1])[key[1]].ravel()
+            if len(columns) == result.shape[1]:
+                result.labels = [self.labels[j] for j in columns]
+                result.kinds = {label: self.kinds[label] for label in result.labels}
+        return result
+
+    @classmethod
+    def from_frame(cls, df, dtype=np.float64):
+        """
+        Build a DataMatrix from an encoded DataFrame with a single copy of the data.
+
+        Args:
+            df (pd.DataFrame): Encoded data with numeric or boolean columns.
+            dtype (np.dtype | str): Buffer dtype, or 'compact' for the smallest integer dtype that
+                holds every column when all columns are integer valued (float64 otherwise).
+
+        Returns:
+            DataMatrix: The typed data matrix.
+        """
+        kinds = {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            # Only integer-valued columns are binary or ordinal, so 'compact' never truncates values
+            if not (values.dtype == bool or np.issubdtype(values.dtype, np.integer) or np.all(np.mod(values, 1) == 0)):
+                kinds[col] = 'continuous'
+            elif len(np.unique(values)) <= 2:
+                kinds[col] = 'binary'
+            else:
+                kinds[col] = 'ordinal'
+
+        if isinstance(dtype, str) and dtype == 'compact':
+            dtype = np.float64
+            if all(kind != 'continuous' for kind in kinds.values()):
+                lo, hi = int(df.min().min()), int(df.max().max())
+                # Smallest signed integer dtype that holds the whole value range
+                dtype = next(t for t in (np.int8, np.int16, np.int32, np.int64)
+                             if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max)
+
+        # Fill column by column so no intermediate object or mixed-dtype array is created
+        values = np.empty(df.shape, dtype=dtype)
+        for j, col in enumerate(df.columns):
+            values[:, j] = df[col].to_numpy()
+        return cls(values, df.columns.tolist(), kinds)
+
+    def take_rows(self, index, out=None):
+        """
+        Gather rows by an index array (e.g. a bootstrap resample).
+
+        Args:
+            index (np.ndarray): Row indices.
+            out (np.ndarray, optional): Preallocated array to gather into, reused across resamples.
+
+        Returns:
+            DataMatrix: The gathered rows.
+        """
+        rows = np.take(np.asarray(self), index, axis=0, out=out)
+        if self.labels is None:
+            return rows.view(DataMatrix)
+        return DataMatrix(rows, self.labels, self.kinds)
+
+def centered_cross_product(X, block_rows=65536):
+    """
+    Centered cross-product matrix Xc.T @ Xc of the columns of X, in float64.
+
+    float32 data is centered and multiplied in float32, which halves the memory traffic of the
+    pass over the samples, but the block products of block_rows rows are summed in float64 so the
+    rounding error does not grow with the number of rows. Other dtypes are computed in float64.
+
+    Args:
+        X (np.ndarray): Data, shape (n_samples, n_features).
+        block_rows (int): Rows per float32 block product.
+
+    Returns:
+        np.ndarray: Float64 matrix, shape (n_features, n_features).
+    """
+    X = np.asarray(X)
+    if X.dtype != np.float32:
+        X = np.asarray(X, dtype=np.float64)
+        Xc = X - X.mean(axis=0)
+        return Xc.T @ Xc
+    mean = X.mean(axis=0, dtype=np.float64)
+    shift = mean.astype(np.float32)
+    cross = np.zeros((X.shape[1], X.shape[1]))
+    for start in range(0, len(X), block_rows):
+        block = X[start:start + block_rows] - shift
+        cross += block.T @ block
+    # Centering on the float32-rounded mean adds n * d d' with d the rounding error of the mean
+    d = shift - mean
+    return cross - len(X) * np.outer(d, d)
+
+def correlation_matrix(X):
+    """Pearson correlation matrix of the columns of X, in float64 (see centered_cross_product)."""
+    cross = centered_cross_product(X)
+    scale = np.sqrt(np.diag(cross))
+    return cross / np.outer(scale, scale)
+
+def load_and_prepare_student_data(file_path, dtype=np.float64):
+    """Load and encode the student data; dtype is the DataMatrix dtype, e.g. np.float32 for the float32 mode."""
     df = pd.read_csv(file_path)
     df['G_avg'] = df[['G1', 'G2', 'G3']].mean(axis=1)
     
@@ -23,43 +156,155 @@ def load_and_prepare_student_data(file_path):
     
     df_encoded.dropna(inplace=True)  # Drop rows with any NaN values
     labels = df_encoded.columns.tolist()
-    data = df_encoded.to_numpy()
+    data = DataMatrix.from_frame(df_encoded, dtype=dtype)
     
     return df_encoded, labels, data
 
-def load_and_prepare_adult_data(file_path):
-    df = pd.read_csv(file_path)
-    
-    columns_to_keep = ['age', 'workclass', 'education', 'marital.status', 'occupation', 'relationship', 'race', 'sex', 'hours.per.week', 'native.country', 'income']
-    df_filtered = df[columns_to_keep]
+# Columns of the adult census data used for discovery, and the ordinal encoding of its categorical columns
+adult_columns = ['age', 'workclass', 'education', 'marital.status', 'occupation', 'relationship', 'race', 'sex', 'hours.per.week', 'native.country', 'income']
+adult_numeric_columns = ['age', 'hours.per.week']
 
-    # Ordinal encoding mappings
-    workclass_order = {'Private': 1, 'Self-emp-not-inc': 2, 'Self-emp-inc': 3, 'Federal-gov': 4, 'Local-gov': 5, 'State-gov': 6, 'Without-pay': 7, 'Never-worked': 8}
-    education_order = {'Preschool': 1, '1st-4th': 2, '5th-6th': 3, '7th-8th': 4, '9th': 5, '10th': 6, '11th': 7, '12th': 8, 'HS-grad': 9, 'Some-college': 10, 'Assoc-acdm': 11, 'Assoc-voc': 12, 'Bachelors': 13, 'Masters': 14, 'Prof-school': 15, 'Doctorate': 16}
-    marital_status_order = {'Married-civ-spouse': 1, 'Divorced': 2, 'Never-married': 3, 'Separated': 4, 'Widowed': 5, 'Married-spouse-absent': 6, 'Married-AF-spouse': 7}
-    occupation_order = {'Tech-support': 1, 'Craft-repair': 2, 'Other-service': 3, 'Sales': 4, 'Exec-managerial': 5, 'Prof-specialty': 6, 'Handlers-cleaners': 7, 'Machine-op-inspct': 8, 'Adm-clerical': 9, 'Farming-fishing': 10, 'Transport-moving': 11, 'Priv-house-serv': 12, 'Protective-serv': 13, 'Armed-Forces': 14}
-    relationship_order = {'Wife': 1, 'Own-child': 2, 'Husband': 3, 'Not-in-family': 4, 'Other-relative': 5, 'Unmarried': 6}
-    race_order = {'White': 1, 'Asian-Pac-Islander': 2, 'Amer-Indian-Eskimo': 3, 'Other': 4, 'Black': 5}
-    sex_order = {'Male': 1, 'Female': 2}
-    native_country_order = {'United-States': 1, 'Cambodia': 2, 'England': 3, 'Puerto-Rico': 4, 'Canada': 5, 'Germany': 6, 'Outlying-US(Guam-USVI-etc)': 7, 'India': 8, 'Japan': 9, 'Greece': 10, 'South': 11, 'China': 12, 'Cuba': 13, 'Iran': 14, 'Honduras': 15, 'Philippines': 16, 'Italy': 17, 'Poland': 18, 'Jamaica': 19, 'Vietnam': 20, 'Mexico': 21, 'Portugal': 22, 'Ireland': 23, 'France': 24, 'Dominican-Republic': 25, 'Laos': 26, 'Ecuador': 27, 'Taiwan': 28, 'Haiti': 29, 'Columbia': 30, 'Hungary': 31, 'Guatemala': 32, 'Nicaragua': 33, 'Scotland': 34, 'Thailand': 35, 'Yugoslavia': 36, 'El-Salvador': 37, 'Trinadad&Tobago': 38, 'Peru': 39, 'Hong': 40, 'Holand-Netherlands': 41}
-    
-    ordinal_map = {
-        'workclass': workclass_order,
-        'education': education_order,
-        'marital.status': marital_status_order,
-        'occupation': occupation_order,
-        'relationship': relationship_order,
-        'race': race_order,
-        'sex': sex_order,
-        'native.country': native_country_order,
-        'income': {'<=50K': 0, '>50K': 1}
-    }
+# Ordinal encoding mappings
+workclass_order = {'Private': 1, 'Self-emp-not-inc': 2, 'Self-emp-inc': 3, 'Federal-gov': 4, 'Local-gov': 5, 'State-gov': 6, 'Without-pay': 7, 'Never-worked': 8}
+education_order = {'Preschool': 1, '1st-4th': 2, '5th-6th': 3, '7th-8th': 4, '9th': 5, '10th': 6, '11th': 7, '12th': 8, 'HS-grad': 9, 'Some-college': 10, 'Assoc-acdm': 11, 'Assoc-voc': 12, 'Bachelors': 13, 'Masters': 14, 'Prof-school': 15, 'Doctorate': 16}
+marital_status_order = {'Married-civ-spouse': 1, 'Divorced': 2, 'Never-married': 3, 'Separated': 4, 'Widowed': 5, 'Married-spouse-absent': 6, 'Married-AF-spouse': 7}
+occupation_order = {'Tech-support': 1, 'Craft-repair': 2, 'Other-service': 3, 'Sales': 4, 'Exec-managerial': 5, 'Prof-specialty': 6, 'Handlers-cleaners': 7, 'Machine-op-inspct': 8, 'Adm-clerical': 9, 'Farming-fishing': 10, 'Transport-moving': 11, 'Priv-house-serv': 12, 'Protective-serv': 13, 'Armed-Forces': 14}
+relationship_order = {'Wife': 1, 'Own-child': 2, 'Husband': 3, 'Not-in-family': 4, 'Other-relative': 5, 'Unmarried': 6}
+race_order = {'White': 1, 'Asian-Pac-Islander': 2, 'Amer-Indian-Eskimo': 3, 'Other': 4, 'Black': 5}
+sex_order = {'Male': 1, 'Female': 2}
+native_country_order = {'United-States': 1, 'Cambodia': 2, 'England': 3, 'Puerto-Rico': 4, 'Canada': 5, 'Germany': 6, 'Outlying-US(Guam-USVI-etc)': 7, 'India': 8, 'Japan': 9, 'Greece': 10, 'South': 11, 'China': 12, 'Cuba': 13, 'Iran': 14, 'Honduras': 15, 'Philippines': 16, 'Italy': 17, 'Poland': 18, 'Jamaica': 19, 'Vietnam': 20, 'Mexico': 21, 'Portugal': 22, 'Ireland': 23, 'France': 24, 'Dominican-Republic': 25, 'Laos': 26, 'Ecuador': 27, 'Taiwan': 28, 'Haiti': 29, 'Columbia': 30, 'Hungary': 31, 'Guatemala': 32, 'Nicaragua': 33, 'Scotland': 34, 'Thailand': 35, 'Yugoslavia': 36, 'El-Salvador': 37, 'Trinadad&Tobago': 38, 'Peru': 39, 'Hong': 40, 'Holand-Netherlands': 41}
 
-    for col, mapping in ordinal_map.items():
+adult_ordinal_map = {
+    'workclass': workclass_order,
+    'education': education_order,
+    'marital.status': marital_status_order,
+    'occupation': occupation_order,
+    'relationship': relationship_order,
+    'race': race_order,
+    'sex': sex_order,
+    'native.country': native_country_order,
+    'income': {'<=50K': 0, '>50K': 1}
+}
+
+def _read_adult_chunks(file_path, chunksize):
+    """Stream the adult columns of a census extract, reading '?' placeholders as missing."""
+    return pd.read_csv(file_path, usecols=adult_columns, na_values=['?'], skipinitialspace=True,
+                       dtype={col: str for col in adult_ordinal_map}, chunksize=chunksize)
+
+def _normalize_adult_chunk(chunk, unknown='error'):
+    """Mark unparseable numbers and categories outside adult_ordinal_map as missing, or raise on them."""
+    chunk = chunk[adult_columns].copy()
+    # Test-set extracts write the income classes as '<=50K.' and '>50K.'
+    chunk['income'] = chunk['income'].str.rstrip('.')
+    for col, mapping in adult_ordinal_map.items():
+        invalid = chunk[col].notna() & ~chunk[col].isin(list(mapping))
+        if invalid.any():
+            if unknown == 'error':
+                raise ValueError(f"Unknown {col} categories: {sorted(chunk.loc[invalid, col].unique())[:10]}")
+            chunk.loc[invalid, col] = np.nan
+    for col in adult_numeric_columns:
+        chunk[col] = pd.to_numeric(chunk[col], errors='raise' if unknown == 'error' else 'coerce')
+    return chunk
+
+def adult_fill_values(file_path, chunksize=100000, unknown='error'):
+    """
+    Imputation values for the adult columns from one streaming pass over a census extract.
+
+    Categorical columns use their most frequent category and numeric columns their median,
+    both computed from per-value counts so memory does not grow with the file.
+
+    Returns:
+        dict: Column name to fill value.
+    """
+    counts = {col: pd.Series(dtype=np.float64) for col in adult_columns}
+    for chunk in _read_adult_chunks(file_path, chunksize):
+        chunk = _normalize_adult_chunk(chunk, unknown)
+        for col in adult_columns:
+            counts[col] = counts[col].add(chunk[col].value_counts(), fill_value=0)
+
+    fill_values = {}
+    for col, value_counts in counts.items():
+        if col in adult_numeric_columns:
+            value_counts = value_counts.sort_index()
+            median = value_counts.index[np.searchsorted(value_counts.cumsum().values, value_counts.sum() / 2)]
+            fill_values[col] = int(median)
+        else:
+            fill_values[col] = value_counts.idxmax()
+    return fill_values
+
+def iter_clean_adult_chunks(file_path, missing='drop', fill_values=None, unknown='error', chunksize=100000):
+    """
+    Stream a raw adult census extract (e.g. adult.csv) as cleaned chunks in constant memory.
+
+    Only adult_columns are read; extra columns such as fnlwgt or capital.gain are skipped. '?'
+    placeholders become missing values, and categories are validated against adult_ordinal_map.
+
+    Args:
+        file_path (str): Raw CSV file.
+        missing (str): 'drop' removes rows with a missing value; 'impute' fills them (see adult_fill_values).
+        fill_values (dict, optional): Column fill values for 'impute'; computed with an extra pass if omitted.
+        unknown (str): 'error' raises on values outside the ordinal maps; 'missing' treats them as missing.
+        chunksize (int): Rows per chunk.
+
+    Yields:
+        pd.DataFrame: Cleaned chunks with the adult_columns, category strings and integer numeric columns.
+    """
+    if missing not in ('drop', 'impute'):
+        raise ValueError(f"Invalid missing value policy: {missing}. Choose either 'drop' or 'impute'.")
+    if missing == 'impute' and fill_values is None:
+        fill_values = adult_fill_values(file_path, chunksize=chunksize, unknown=unknown)
+
+    for chunk in _read_adult_chunks(file_path, chunksize):
+        chunk = _normalize_adult_chunk(chunk, unknown)
+        if missing == 'drop':
+            chunk = chunk.dropna()
+        else:
+            chunk = chunk.fillna(fill_values)
+        chunk[adult_numeric_columns] = chunk[adult_numeric_columns].astype(np.int64)
+        yield chunk
+
+def clean_adult_data(file_path, output_path='adult_cleaned.csv', missing='drop', fill_values=None, unknown='error',
+                     chunksize=100000):
+    """
+    Regenerate adult_cleaned.csv from a raw census extract, one chunk at a time.
+
+    Arguments are those of iter_clean_adult_chunks.
+
+    Returns:
+        int: Number of rows written.
+    """
+    n_rows = 0
+    with open(output_path, 'w', newline='') as f:
+        for i, chunk in enumerate(iter_clean_adult_chunks(file_path, missing=missing, fill_values=fill_values,
+                                                          unknown=unknown, chunksize=chunksize)):
+            # CRLF rows, as in the shipped adult_cleaned.csv
+            chunk.to_csv(f, header=(i == 0), index=False, lineterminator='\r\n')
+            n_rows += len(chunk)
+    print(f"Cleaned data ({n_rows} rows) saved at: {output_path}")
+    return n_rows
+
+def encode_adult_frame(df_filtered):
+    """Ordinal-encode the categorical adult columns."""
+    df_filtered = df_filtered[adult_columns].copy()
+    for col, mapping in adult_ordinal_map.items():
         if col in df_filtered.columns:
             df_filtered[col] = df_filtered[col].map(mapping)
-    
-    df_encoded = df_filtered * 1
+    return df_filtered * 1
+
+def load_and_prepare_adult_data(file_path, clean=False, missing='drop', chunksize=100000, dtype=np.float64):
+    """
+    Load and encode the adult data.
+
+    With clean=True, file_path is a raw extract such as adult.csv that is cleaned and encoded chunk
+    by chunk (see iter_clean_adult_chunks), so only the encoded data is ever held in memory.
+    dtype is the DataMatrix dtype, e.g. np.float32 for the float32 compute mode.
+    """
+    if clean:
+        chunks = iter_clean_adult_chunks(file_path, missing=missing, chunksize=chunksize)
+        df_encoded = pd.concat([encode_adult_frame(chunk) for chunk in chunks], ignore_index=True)
+    else:
+        df = pd.read_csv(file_path)
+        df_encoded = encode_adult_frame(df)
 
     # Check for non-numeric values and NaNs
     print("Adult Data Preparation:")
@@ -71,7 +316,7 @@ def load_and_prepare_adult_data(file_path):
     assert not df_encoded.isnull().values.any(), "Data contains NaNs"
 
     labels = df_encoded.columns.tolist()
-    data = df_encoded.to_numpy()
+    data = DataMatrix.from_frame(df_encoded, dtype=dtype)
     
     return df_encoded, labels, data
 
@@ -85,3 +330,16 @@ student_variable_mapping = {
 
 def apply_variable_mapping(variables, mapping):
     return [mapping.get(var, var) for var in variables]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Clean a raw adult census extract into adult_cleaned.csv.')
+    parser.add_argument('input', help='Raw CSV file, e.g. adult.csv')
+    parser.add_argument('--output', default='adult_cleaned.csv', help='Cleaned CSV file to write')
+    parser.add_argument('--missing', choices=['drop', 'impute'], default='drop', help='Drop or impute rows with missing values')
+    parser.add_argument('--unknown', choices=['error', 'missing'], default='error', help='Raise on, or treat as missing, categories outside the ordinal maps')
+    parser.add_argument('--chunksize', type=int, default=100000, help='Rows per chunk')
+    args = parser.parse_args()
+
+    clean_adult_data(args.input, args.output, missing=args.missing, unknown=args.unknown, chunksize=args.chunksize)
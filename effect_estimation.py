@@ -0,0 +1,313 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from sklearn.linear_model import LogisticRegression
+
+# Per-worker state, set once by _init_worker so resamples only ship seeds, not data
+_worker_state = {}
+
+def build_design_matrix(df, treatment, outcome, covariates, threshold=None):
+    """
+    Build the propensity design matrix once for all bootstrap resamples.
+
+    Covariates are standardized and stacked into a single contiguous float64 matrix. A treatment
+    with more than two distinct values is binarized at the threshold (median by default).
+
+    Args:
+        df (pd.DataFrame): Encoded data, e.g. from load_and_prepare_student_data.
+        treatment (str): Name of the treatment column.
+        outcome (str): Name of the outcome column.
+        covariates (list): Names of the adjustment covariates.
+        threshold (float, optional): Treatment values above this are treated as 'treated'.
+
+    Returns:
+        tuple: (X, t, y) with X of shape (n, len(covariates)), t in {0, 1} and y as float64.
+    """
+    X = np.ascontiguousarray(df[covariates].to_numpy(dtype=np.float64))
+    std = X.std(axis=0)
+    X -= X.mean(axis=0)
+    X /= np.where(std > 0, std, 1.0)
+
+    t_raw = df[treatment].to_numpy(dtype=np.float64)
+    values = np.unique(t_raw)
+    if threshold is None and len(values) == 2:
+        t = (t_raw == values[1]).astype(np.float64)
+    else:
+        if threshold is None:
+            threshold = np.median(t_raw)
+        t = (t_raw > threshold).astype(np.float64)
+
+    y = df[outcome].to_numpy(dtype=np.float64)
+    return X, t, y
+
+def ipw_effects(t, y, e):
+    """
+    Normalized (Hajek) inverse propensity weighted ATE and ATT.
+
+    Args:
+        t (np.ndarray): Binary treatment indicator.
+        y (np.ndarray): Outcome.
+        e (np.ndarray): Propensity scores P(t=1 | X).
+
+    Returns:
+        tuple: (ate, att)
+    """
+    treated = t == 1
+    w1 = 1.0 / e[treated]
+    w0 = 1.0 / (1.0 - e[~treated])
+    ate = np.average(y[treated], weights=w1) - np.average(y[~treated], weights=w0)
+    odds = e[~treated] / (1.0 - e[~treated])
+    att = y[treated].mean() - np.average(y[~treated], weights=odds)
+    return ate, att
+
+def _nearest_outcomes(source_e, target_e, target_y):
+    """Outcome of the nearest target unit (by propensity score) for each source unit."""
+    order = np.argsort(target_e)
+    sorted_e = target_e[order]
+    if len(sorted_e) == 1:
+        return np.full(len(source_e), target_y[0])
+    pos = np.clip(np.searchsorted(sorted_e, source_e), 1, len(sorted_e) - 1)
+    left, right = sorted_e[pos - 1], sorted_e[pos]
+    pos -= (source_e - left) <= (right - source_e)
+    return target_y[order][pos]
+
+def matching_effects(t, y, e):
+    """
+    One-to-one nearest-neighbour propensity score matching (with replacement) ATE and ATT.
+
+    Args:
+        t (np.ndarray): Binary treatment indicator.
+        y (np.ndarray): Outcome.
+        e (np.ndarray): Propensity scores P(t=1 | X).
+
+    Returns:
+        tuple: (ate, att)
+    """
+    treated = t == 1
+    e1, y1, e0, y0 = e[treated], y[treated], e[~treated], y[~treated]
+    att = np.mean(y1 - _nearest_outcomes(e1, e0, y0))
+    atc = np.mean(_nearest_outcomes(e0, e1, y1) - y0)
+    p_treated = treated.mean()
+    ate = p_treated * att + (1.0 - p_treated) * atc
+    return ate, att
+
+def _estimate(X, t, y, model, clip):
+    """Fit the propensity model and return [ipw_ate, ipw_att, matching_ate, matching_att]."""
+    model.fit(X, t)
+    # The weighted averages are taken in float64 even when the design matrix is float32
+    e = np.clip(model.predict_proba(X)[:, 1].astype(np.float64), clip, 1.0 - clip)
+    y = np.asarray(y, dtype=np.float64)
+    return np.array(ipw_effects(t, y, e) + matching_effects(t, y, e))
+
+def _init_worker(shm_name, shape, clip, C, dtype=np.float64):
+    """Attach to the shared (X | t | y) buffer once per worker process."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    buffer = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    _worker_state.update(
+        shm=shm,
+        X=buffer[:, :-2],
+        t=buffer[:, -2],
+        y=buffer[:, -1],
+        clip=clip,
+        # Warm starting reuses the previous resample's coefficients as the solver's initial point
+        model=LogisticRegression(C=C, warm_start=True, max_iter=1000),
+    )
+
+def _run_resamples(seed_seq, n_resamples):
+    """Estimate effects on n_resamples bootstrap resamples drawn from seed_seq."""
+    X, t, y = _worker_state['X'], _worker_state['t'], _worker_state['y']
+    rng = np.random.default_rng(seed_seq)
+    n = len(y)
+    results = np.empty((n_resamples, 4))
+    for i in range(n_resamples):
+        idx = rng.integers(0, n, size=n)
+        while t[idx].min() == t[idx].max():  # Both arms are needed for every estimate
+            idx = rng.integers(0, n, size=n)
+        results[i] = _estimate(X[idx], t[idx], y[idx], _worker_state['model'], _worker_state['clip'])
+    return results
+
+def _run_resamples_on(design, clip, C, seed_seq, n_resamples):
+    """_run_resamples for executors without shared memory: the (X | t | y) matrix travels with the job."""
+    _worker_state.update(
+        X=design[:, :-2],
+        t=design[:, -2],
+        y=design[:, -1],
+        clip=clip,
+        model=LogisticRegression(C=C, warm_start=True, max_iter=1000),
+    )
+    return _run_resamples(seed_seq, n_resamples)
+
+def bootstrap_effects(df, treatment, outcome, covariates, n_bootstrap=1000, alpha=0.05, threshold=None,
+                      n_jobs=None, batch_size=50, random_state=42, clip=0.01, C=1.0, executor=None,
+                      dtype=np.float64):
+    """
+    Bootstrap percentile confidence intervals for IPW and matching treatment effects.
+
+    The design matrix is built once and placed in shared memory; worker processes attach to it and
+    draw their own resample indices, so only seeds and result rows cross process boundaries.
+
+    Args:
+        df (pd.DataFrame): Encoded data.
+        treatment (str): Name of the treatment column.
+        outcome (str): Name of the outcome column.
+        covariates (list): Names of the adjustment covariates.
+        n_bootstrap (int): Number of bootstrap resamples.
+        alpha (float): Significance level of the percentile intervals.
+        threshold (float, optional): Binarization threshold for non-binary treatments.
+        n_jobs (int, optional): Number of worker processes (defaults to os.cpu_count()).
+        batch_size (int): Number of resamples per submitted task.
+        random_state (int): Seed for the resample generator.
+        clip (float): Propensity scores are clipped to [clip, 1 - clip].
+        C (float): Inverse regularization strength of the propensity model.
+        executor (optional): A job_executor executor (e.g. SharedDirectoryExecutor) to run the batches on
+            instead of the local shared-memory pool; each batch then carries its own copy of the data.
+        dtype (np.dtype): dtype of the shared design matrix. np.float32 halves the memory of the buffer
+            and of every resample gather, and the propensity model is fitted in float32.
+
+    Returns:
+        pd.DataFrame: One row per (estimator, estimand) with estimate, ci_lower and ci_upper.
+    """
+    X, t, y = build_design_matrix(df, treatment, outcome, covariates, threshold=threshold)
+    X = X.astype(dtype, copy=False)
+    point = _estimate(X, t, y, LogisticRegression(C=C, max_iter=1000), clip)
+
+    batches = [batch_size] * (n_bootstrap // batch_size)
+    if n_bootstrap % batch_size:
+        batches.append(n_bootstrap % batch_size)
+    seeds = np.random.SeedSequence(random_state).spawn(len(batches))
+
+    if executor is not None:
+        design = np.column_stack([X, t, y]).astype(dtype, copy=False)
+        n = len(batches)
+        samples = np.vstack(executor.map(_run_resamples_on, [design] * n, [clip] * n, [C] * n, seeds, batches))
+        return _percentile_table(point, samples, alpha)
+
+    shape = (len(y), X.shape[1] + 2)
+    shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    try:
+        buffer = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        buffer[:, :-2], buffer[:, -2], buffer[:, -1] = X, t, y
+
+        with ProcessPoolExecutor(max_workers=n_jobs or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(shm.name, shape, clip, C, dtype)) as executor:
+            samples = np.vstack(list(executor.map(_run_resamples, seeds, batches)))
+        del buffer
+    finally:
+        shm.close()
+        shm.unlink()
+    return _percentile_table(point, samples, alpha)
+
+def _percentile_table(point, samples, alpha):
+    lower, upper = np.percentile(samples, [100 * alpha / 2, 100 * (1 - alpha / 2)], axis=0)
+    index = pd.MultiIndex.from_product([['IPW', 'Matching'], ['ATE', 'ATT']], names=['estimator', 'estimand'])
+    return pd.DataFrame({'estimate': point, 'ci_lower': lower, 'ci_upper': upper}, index=index)
+
+def sweep_effects(df, dag, pairs=None, variable_mapping=None, z=1.96):
+    """
+    Regression-adjusted effect estimates for every treatment -> outcome pair suggested by a DAG.
+
+    The encoded data is reduced once to the Gram matrix of [1 | variables]. Each pair's OLS
+    regression of outcome on (1, treatment, backdoor set) is then solved from that Gram matrix,
+    with all pairs that share an adjustment-set size solved in one batched call.
+
+    Args:
+        df (pd.DataFrame): Encoded data.
+        dag (CompiledDAG): Compiled DAG from dag_utils.compile_dag.
+        pairs (iterable, optional): (treatment, outcome) pairs; defaults to all dag.causal_pairs().
+        variable_mapping (dict, optional): Maps DAG node names to encoded column names.
+        z (float): Normal quantile for the confidence intervals.
+
+    Returns:
+        pd.DataFrame: One row per pair with the adjustment set, estimate, std_error and interval.
+    """
+    mapping = variable_mapping or {}
+    column = {name: i + 1 for i, name in enumerate(df.columns)}
+    Z = np.empty((len(df), len(column) + 1))
+    Z[:, 0] = 1.0
+    Z[:, 1:] = df.to_numpy(dtype=np.float64)
+    gram = Z.T @ Z
+    n = len(df)
+
+    if pairs is None:
+        pairs = dag.causal_pairs()
+    groups = {}
+    for treatment, outcome in pairs:
+        adjustment = dag.backdoor_set(treatment, outcome)
+        if adjustment is None:
+            print(f"No valid backdoor set for {treatment} -> {outcome}, skipping")
+            continue
+        regressors = [0] + [column[mapping.get(v, v)] for v in [treatment] + adjustment]
+        groups.setdefault(len(regressors), []).append(
+            (treatment, outcome, adjustment, regressors, column[mapping.get(outcome, outcome)]))
+
+    rows = []
+    for k, group in groups.items():
+        idx = np.array([g[3] for g in group])
+        target = np.array([g[4] for g in group])
+        A = gram[idx[:, :, None], idx[:, None, :]]
+        b = gram[idx, target[:, None]]
+        # The pseudo-inverse keeps collinear adjustment sets from failing the whole batch
+        A_inv = np.linalg.pinv(A, hermitian=True)
+        beta = np.einsum('mij,mj->mi', A_inv, b)
+        rss = gram[target, target] - np.einsum('mi,mi->m', beta, b)
+        se = np.sqrt(np.maximum(rss, 0) / max(n - k, 1) * A_inv[:, 1, 1])
+        for (treatment, outcome, adjustment, _, _), estimate, std_error in zip(group, beta[:, 1], se):
+            rows.append({
+                'treatment': treatment,
+                'outcome': outcome,
+                'adjustment_set': ';'.join(adjustment),
+                'estimate': estimate,
+                'std_error': std_error,
+                'ci_lower': estimate - z * std_error,
+                'ci_upper': estimate + z * std_error,
+            })
+    return pd.DataFrame(rows, columns=['treatment', 'outcome', 'adjustment_set', 'estimate', 'std_error', 'ci_lower', 'ci_upper'])
+
+def main(dataset, n_bootstrap, n_jobs, dag_file=None, output_file='effect_sweep.csv', queue_dir=None, dtype=np.float64):
+    variable_mapping = None
+    if dataset == 'student':
+        from data_preparation import load_and_prepare_student_data, student_variable_mapping
+        df_encoded, labels, data = load_and_prepare_student_data('data/student-por_raw.csv')
+        treatment, outcome = 'absences', 'G_avg'
+        variable_mapping = student_variable_mapping
+    elif dataset == 'adult':
+        from data_preparation import load_and_prepare_adult_data
+        df_encoded, labels, data = load_and_prepare_adult_data('data/adult_cleaned.csv')
+        treatment, outcome = 'hours.per.week', 'income'
+    else:
+        raise ValueError("Invalid dataset. Choose either 'student' or 'adult'.")
+
+    if dag_file:
+        from dag_utils import compile_dag
+        dag, dag_data = compile_dag(dag_file)
+        results = sweep_effects(df_encoded, dag, variable_mapping=variable_mapping)
+        results.to_csv(output_file, index=False)
+        print(f"Effect sweep over {len(results)} pairs saved at: {output_file}")
+        return
+
+    covariates = [label for label in labels if label not in (treatment, outcome)]
+    print(f"Bootstrapping {treatment} -> {outcome} with {n_bootstrap} resamples")
+    executor = None
+    if queue_dir:
+        from job_executor import SharedDirectoryExecutor
+        executor = SharedDirectoryExecutor(queue_dir)
+    results = bootstrap_effects(df_encoded, treatment, outcome, covariates, n_bootstrap=n_bootstrap, n_jobs=n_jobs,
+                                executor=executor, dtype=dtype)
+    print(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bootstrap effect intervals for one pair, or sweep all pairs of a DAG.')
+    parser.add_argument('--dataset', required=True, choices=['student', 'adult'], help='Dataset to use (student or adult)')
+    parser.add_argument('--n_bootstrap', type=int, default=1000, help='Number of bootstrap resamples')
+    parser.add_argument('--n_jobs', type=int, default=None, help='Number of worker processes')
+    parser.add_argument('--dag', default=None, help='causalvis DAG file; sweeps every treatment -> outcome pair it suggests')
+    parser.add_argument('--output', default='effect_sweep.csv', help='Output table for the sweep mode')
+    parser.add_argument('--queue_dir', default=None, help='Shared queue directory; resamples run on job_executor workers')
+    parser.add_argument('--float32', action='store_true', help='Bootstrap on a float32 design matrix')
+    args = parser.parse_args()
+
+    main(args.dataset, args.n_bootstrap, args.n_jobs, dag_file=args.dag, output_file=args.output, queue_dir=args.queue_dir,
+         dtype=np.float32 if args.float32 else np.float64)
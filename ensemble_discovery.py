@@ -0,0 +1,127 @@
+import numpy as np
+import networkx as nx
+from concurrent.futures import ThreadPoolExecutor
+from causallearn.search.ConstraintBased.PC import pc
+from ci_tests import shared_fisherz
+from lingam_algorithm import GramPrunedICALiNGAM
+from direct_lingam import residual_entropies, pwling_causal_order, estimate_adjacency_matrix
+from data_preparation import correlation_matrix
+
+class SharedArtifacts:
+    """
+    Preprocessing shared by the ensemble members, computed once per dataset.
+
+    Args:
+        data (np.ndarray): Input data, shape (n_samples, n_features).
+        dtype (np.dtype): dtype of the standardized matrix; with np.float32 the correlation matrix is
+            still accumulated in float64.
+    """
+
+    def __init__(self, data, dtype=np.float64):
+        X = np.asarray(data, dtype=dtype)
+        if X.dtype == np.float32:
+            mean, std = X.mean(axis=0, dtype=np.float64), X.std(axis=0, dtype=np.float64)
+            self.standardized = (X - mean.astype(np.float32)) / std.astype(np.float32)
+            self.correlation = correlation_matrix(self.standardized)
+        else:
+            self.standardized = (X - X.mean(axis=0)) / X.std(axis=0)
+            self.correlation = self.standardized.T @ self.standardized / len(X)
+        self._residual_entropies = None
+
+    @property
+    def residual_entropies(self):
+        """Entropies of every pairwise standardized regression residual, computed on first use."""
+        if self._residual_entropies is None:
+            self._residual_entropies = residual_entropies(self.standardized, self.correlation)
+        return self._residual_entropies
+
+def pc_member(artifacts, alpha=0.1, stable=False, uc_rule=2):
+    """PC with a Fisher-z test that reads the shared correlation matrix. Returns edge votes."""
+    cg = pc(artifacts.standardized, alpha=alpha, stable=stable, uc_rule=uc_rule, indep_test=shared_fisherz,
+            correlation_matrix=artifacts.correlation, show_progress=False)
+    graph = cg.G.graph
+    votes = np.zeros(graph.shape)
+    # graph[j, i] == 1 and graph[i, j] == -1 means i -> j; an undirected edge votes half for each direction
+    votes[(graph.T == 1) & (graph == -1)] = 1.0
+    votes[(graph == -1) & (graph.T == -1)] = 0.5
+    return votes
+
+def ica_lingam_member(artifacts, max_iter=500):
+    """ICA-LiNGAM on the shared standardized matrix. Returns edge votes."""
+    model = GramPrunedICALiNGAM(max_iter=max_iter)
+    model.fit(artifacts.standardized)
+    # adjacency_matrix_[i, j] != 0 means x_j -> x_i
+    return (model.adjacency_matrix_.T != 0).astype(float)
+
+def direct_lingam_member(artifacts):
+    """DirectLiNGAM (pwling) seeded with the shared correlation matrix and residual entropies."""
+    order = pwling_causal_order(artifacts.standardized, corr=artifacts.correlation,
+                                first_residual_entropies=artifacts.residual_entropies)
+    B = estimate_adjacency_matrix(artifacts.standardized, order)
+    return (B.T != 0).astype(float)
+
+ENSEMBLE_MEMBERS = {
+    "PC": pc_member,
+    "LiNGAM": ica_lingam_member,
+    "DirectLiNGAM": direct_lingam_member,
+}
+
+def consensus_graph(votes, labels, weights=None, threshold=0.5):
+    """
+    Merge member edge votes into a weighted-vote consensus graph.
+
+    Args:
+        votes (dict): Algorithm name to a (n_features, n_features) matrix with votes[i, j] in [0, 1]
+            for the edge i -> j.
+        labels (list): Node labels.
+        weights (dict, optional): Algorithm name to vote weight (defaults to 1 for every member).
+        threshold (float): Minimum agreement for an edge to enter the consensus graph.
+
+    Returns:
+        tuple: (nx.DiGraph with an 'agreement' edge attribute, agreement matrix)
+    """
+    weights = weights or {}
+    total = sum(weights.get(name, 1.0) for name in votes)
+    agreement = sum(weights.get(name, 1.0) * v for name, v in votes.items()) / total
+
+    graph = nx.DiGraph()
+    graph.add_nodes_from(labels)
+    for i, j in zip(*np.nonzero(agreement >= threshold)):
+        # Keep only the better-supported direction of a pair
+        if agreement[i, j] > agreement[j, i] or (agreement[i, j] == agreement[j, i] and i < j):
+            graph.add_edge(labels[i], labels[j], agreement=float(agreement[i, j]))
+    return graph, agreement
+
+def run_ensemble(data, labels, members=None, weights=None, threshold=0.5, max_workers=None, dtype=np.float64):
+    """
+    Run PC, ICA-LiNGAM and DirectLiNGAM concurrently on shared preprocessing and merge their graphs.
+
+    Args:
+        data (np.ndarray): Input data, shape (n_samples, n_features).
+        labels (list): List of labels for the data columns.
+        members (dict, optional): Algorithm name to member function (defaults to ENSEMBLE_MEMBERS).
+        weights (dict, optional): Algorithm name to vote weight.
+        threshold (float): Minimum agreement for an edge to enter the consensus graph.
+        max_workers (int, optional): Number of threads.
+        dtype (np.dtype): Compute dtype of the shared preprocessing (np.float32 for the float32 mode).
+
+    Returns:
+        tuple: (consensus nx.DiGraph, agreement matrix, dict of per-member vote matrices)
+    """
+    members = members or ENSEMBLE_MEMBERS
+    artifacts = SharedArtifacts(data, dtype=dtype)
+
+    # Members run in threads so they share the artifacts without copies; NumPy releases the GIL
+    with ThreadPoolExecutor(max_workers=max_workers or len(members)) as executor:
+        futures = {name: executor.submit(func, artifacts) for name, func in members.items()}
+        votes = {}
+        for name, future in futures.items():
+            try:
+                votes[name] = future.result()
+            except Exception as e:
+                print(f"Error running {name} in ensemble: {e}")
+
+    if not votes:
+        raise RuntimeError("All ensemble members failed")
+    graph, agreement = consensus_graph(votes, labels, weights=weights, threshold=threshold)
+    return graph, agreement, votes
@@ -0,0 +1,319 @@
+import os
+import json
+import struct
+import argparse
+import numpy as np
+import networkx as nx
+from dag_utils import CompiledDAG
+
+# File layout: a 64-byte header, fixed-size run records, then a JSON index and a 16-byte trailer
+# (index offset, trailer magic). Appending rewrites only the index, and the records can be memory-mapped.
+# The trailer at the end of the file always points at a complete index, so a crash during an append
+# leaves the earlier runs readable.
+MAGIC = b'CGRAPHA1'
+INDEX_MAGIC = b'CGRAIDX1'
+HEADER_SIZE = 64
+TRAILER = struct.Struct('<Q8s')
+
+# Edge marks follow causallearn's GeneralGraph matrix: marks[j, i] == 1 and marks[i, j] == -1 is i -> j,
+# -1 at both ends is an undirected edge i - j, 1 at both ends is i <-> j and 2 is a circle endpoint
+TAIL, ARROW, CIRCLE = -1, 1, 2
+
+def _record_dtype(n_nodes):
+    return np.dtype([('marks', 'i1', (n_nodes, n_nodes)), ('weights', '<f4', (n_nodes, n_nodes))])
+
+def marks_from_networkx(graph, labels):
+    """
+    Edge marks and weights of a directed NetworkX graph whose nodes are labels or label indices.
+
+    Nodes may also be causallearn GraphNodes named X1..Xn, as produced by causal_learn_to_networkx,
+    or labels with '.' replaced by '_', as in run_direct_lingam.
+    """
+    index = {}
+    for i, label in enumerate(labels):
+        index.update({label.replace('.', '_'): i, f'X{i + 1}': i, i: i})
+    index.update({label: i for i, label in enumerate(labels)})
+    n = len(labels)
+    marks = np.zeros((n, n), dtype=np.int8)
+    weights = np.zeros((n, n), dtype=np.float32)
+    for u, v, attrs in graph.edges(data=True):
+        i, j = index[getattr(u, 'get_name', lambda: u)()], index[getattr(v, 'get_name', lambda: v)()]
+        marks[j, i] = ARROW
+        marks[i, j] = ARROW if graph.has_edge(v, u) else TAIL
+        weights[j, i] = attrs.get('weight', 1.0)
+    return marks, weights
+
+def marks_from_adjacency(B):
+    """Edge marks and weights of a LiNGAM adjacency matrix (B[i, j] is the effect of x_j on x_i)."""
+    B = np.asarray(B)
+    edges = B != 0
+    marks = np.zeros(B.shape, dtype=np.int8)
+    marks[edges] = ARROW
+    marks[edges.T & ~edges] = TAIL
+    return marks, B.astype(np.float32)
+
+def to_networkx(marks, labels, undirected='lower_first'):
+    """
+    Directed NetworkX graph of an edge-mark matrix.
+
+    Args:
+        undirected (str): 'lower_first' orients undirected and bidirected edges from the lower to the
+            higher label index, 'both' keeps both directions and 'drop' leaves them out.
+    """
+    graph = nx.DiGraph()
+    graph.add_nodes_from(labels)
+    sources, targets = np.nonzero(np.asarray(marks).T == ARROW)
+    for i, j in zip(sources, targets):
+        if marks[i, j] == TAIL:
+            graph.add_edge(labels[i], labels[j])
+    for i, j in zip(*np.nonzero(np.triu((marks == marks.T) & (marks != 0)))):
+        if undirected == 'lower_first':
+            graph.add_edge(labels[i], labels[j])
+        elif undirected == 'both':
+            graph.add_edges_from([(labels[i], labels[j]), (labels[j], labels[i])])
+    return graph
+
+class GraphArchive:
+    """
+    Many discovered graphs over one set of labels in a single memory-mappable file.
+
+    Each run stores an int8 edge-mark matrix, a float32 weight matrix and a JSON-able metadata
+    dict under a unique run id. Records have a fixed size, so reading a run is one slice of a
+    np.memmap; appends are buffered and the index is written once on flush or close.
+
+    Args:
+        path (str): Archive file.
+        labels (list, optional): Node labels; required when creating a new archive.
+        mode (str): 'r' to read, 'a' to create or append.
+    """
+
+    def __init__(self, path, labels=None, mode='r'):
+        self.path = path
+        self.mode = mode
+        self._pending = []
+        if os.path.exists(path):
+            self._read_index()
+            if labels is not None and list(labels) != self.labels:
+                raise ValueError(f"Labels do not match those of the archive {path}")
+        elif mode == 'a':
+            if labels is None:
+                raise ValueError("Labels are required to create a graph archive")
+            self.labels = list(labels)
+            self.runs = []
+            self._data_end = HEADER_SIZE
+            with open(path, 'wb') as f:
+                f.write(MAGIC + struct.pack('<I', len(self.labels)).ljust(HEADER_SIZE - len(MAGIC), b'\0'))
+            self._write_index()
+        else:
+            raise FileNotFoundError(path)
+        self.record_dtype = _record_dtype(len(self.labels))
+        self._positions = {run['run_id']: i for i, run in enumerate(self.runs)}
+        self._records = None
+
+    def _read_index(self):
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a graph archive")
+            f.seek(-TRAILER.size, os.SEEK_END)
+            trailer_offset = f.tell()
+            index_offset, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{self.path} has no index; it was not closed after writing")
+            f.seek(index_offset)
+            index = json.loads(f.read(trailer_offset - index_offset))
+        self.labels = index['labels']
+        self.runs = index['runs']
+        # The index may sit past the records if an append was interrupted, so count them instead
+        self._data_end = HEADER_SIZE + len(self.runs) * _record_dtype(len(self.labels)).itemsize
+
+    def _index_bytes(self, runs):
+        return json.dumps({'labels': self.labels, 'runs': runs}, separators=(',', ':')).encode('utf-8')
+
+    def _write_index(self):
+        with open(self.path, 'r+b') as f:
+            f.seek(self._data_end)
+            f.write(self._index_bytes(self.runs))
+            f.write(TRAILER.pack(self._data_end, INDEX_MAGIC))
+            f.truncate()
+
+    def append(self, run_id, graph, weights=None, **metadata):
+        """
+        Add a run.
+
+        Args:
+            run_id (str): Unique id of the run.
+            graph: nx.DiGraph, causallearn GeneralGraph, or an edge-mark matrix. A DiGraph returned
+                by the PC or LiNGAM runners is archived from the 'general_graph' or
+                'adjacency_matrix' it carries in graph.graph.
+            weights (np.ndarray, optional): Edge weights for an edge-mark matrix.
+            **metadata: JSON-serializable run metadata (algorithm, parameters, scores, ...).
+        """
+        if self.mode != 'a':
+            raise ValueError("Archive is opened read-only")
+        if run_id in self._positions:
+            raise ValueError(f"Run {run_id} already exists in {self.path}")
+        if isinstance(graph, nx.DiGraph) and 'general_graph' in graph.graph:
+            # PC's DiGraph drops one direction of each undirected edge; causallearn's marks keep it
+            graph = graph.graph['general_graph']
+        if isinstance(graph, nx.DiGraph):
+            if 'adjacency_matrix' in graph.graph:
+                # LiNGAM's DiGraph is nx.DiGraph(B), whose edges point from effect to cause
+                marks, graph_weights = marks_from_adjacency(graph.graph['adjacency_matrix'])
+            else:
+                marks, graph_weights = marks_from_networkx(graph, self.labels)
+            weights = graph_weights if weights is None else weights
+        else:
+            marks = np.asarray(getattr(graph, 'graph', graph), dtype=np.int8)
+            weights = (marks == ARROW).astype(np.float32) if weights is None else weights
+        record = np.zeros(1, dtype=self.record_dtype)
+        record['marks'], record['weights'] = marks, weights
+        self._positions[run_id] = len(self.runs)
+        self.runs.append({'run_id': run_id, 'metadata': metadata})
+        self._pending.append(record)
+
+    def flush(self):
+        """
+        Write buffered runs and the updated index.
+
+        The new runs go where the current index is, so that index is first copied past the space
+        the new runs and index will take and the trailer is pointed at the copy. The new index and
+        its trailer are written next, and truncating the file to them drops the copy; each step is
+        synced before the next, so a crash at any point leaves a complete index at the end of the file.
+        """
+        if not self._pending:
+            return
+        records = np.concatenate(self._pending)
+        old_index = self._index_bytes(self.runs[:len(self.runs) - len(self._pending)])
+        new_index = self._index_bytes(self.runs)
+        data_end = self._data_end + records.nbytes
+        new_end = data_end + len(new_index) + TRAILER.size
+        self._records = None  # Release the map before the file grows
+        with open(self.path, 'r+b') as f:
+            backup_offset = max(f.seek(0, os.SEEK_END), new_end)
+            self._write_synced(f, backup_offset, old_index + TRAILER.pack(backup_offset, INDEX_MAGIC))
+            self._write_synced(f, self._data_end, records.tobytes())
+            self._write_synced(f, data_end, new_index + TRAILER.pack(data_end, INDEX_MAGIC))
+            f.truncate(new_end)
+        self._data_end = data_end
+        self._pending = []
+
+    @staticmethod
+    def _write_synced(f, offset, data):
+        f.seek(offset)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+    def close(self):
+        if self.mode == 'a':
+            self.flush()
+        self._records = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return len(self.runs)
+
+    def __contains__(self, run_id):
+        return run_id in self._positions
+
+    @property
+    def run_ids(self):
+        return [run['run_id'] for run in self.runs]
+
+    @property
+    def records(self):
+        """Read-only memory map of all written runs, with 'marks' and 'weights' fields."""
+        if self._records is None:
+            n_written = (self._data_end - HEADER_SIZE) // self.record_dtype.itemsize
+            if n_written == 0:
+                return np.zeros(0, dtype=self.record_dtype)
+            self._records = np.memmap(self.path, dtype=self.record_dtype, mode='r', offset=HEADER_SIZE,
+                                      shape=(n_written,))
+        return self._records
+
+    def __getitem__(self, run_id):
+        """(marks, weights) of a run, as views into the memory map."""
+        if self._pending:
+            self.flush()
+        record = self.records[self._positions[run_id]]
+        return record['marks'], record['weights']
+
+    def metadata(self, run_id):
+        return self.runs[self._positions[run_id]]['metadata']
+
+    def to_networkx(self, run_id, undirected='lower_first'):
+        """Directed NetworkX graph of a run, with the labels as nodes (see to_networkx)."""
+        return to_networkx(self[run_id][0], self.labels, undirected=undirected)
+
+def _layered_positions(graph):
+    """Node coordinates for the causalvis canvas: one row per topological generation."""
+    positions = {}
+    for row, generation in enumerate(nx.topological_generations(graph)):
+        for column, node in enumerate(sorted(generation)):
+            positions[node] = (60 + 150 * column, 40 + 110 * row)
+    return positions
+
+def causalvis_dag(graph, treatment=None, outcome=None, name_mapping=None):
+    """
+    A DAG as a causalvis JSON dict (nodes, links, treatment, outcome and the roles of the pair).
+
+    The roles are derived with CompiledDAG.roles, so the result loads in dag_utils.load_dag and
+    cohort_analysis exactly like a DAG drawn in the causalvis UI.
+
+    Args:
+        graph (nx.DiGraph): Acyclic graph.
+        treatment (str, optional): Treatment node name.
+        outcome (str, optional): Outcome node name.
+        name_mapping (dict, optional): Renames nodes, e.g. encoded columns back to DAG variable names.
+
+    Returns:
+        dict: causalvis DAG.
+    """
+    if name_mapping:
+        graph = nx.relabel_nodes(graph, lambda node: name_mapping.get(node, node))
+    dag = CompiledDAG(graph)
+    positions = _layered_positions(dag.graph)
+    nodes = {
+        name: {'x': positions[name][0], 'y': positions[name][1], 'id': i + 1, 'name': name, '$custom': True, 'tags': []}
+        for i, name in enumerate(dag.nodes)
+    }
+    dag_data = {
+        'nodes': list(nodes.values()),
+        'links': [{'source': nodes[u], 'target': nodes[v]} for u, v in dag.graph.edges()],
+    }
+    if treatment is not None and outcome is not None:
+        dag_data.update(treatment=treatment, outcome=outcome, **dag.roles(treatment, outcome))
+    return dag_data
+
+def export_causalvis(graph, filename, treatment=None, outcome=None, name_mapping=None):
+    """Write causalvis_dag(graph, ...) to a JSON file that dag_utils.load_dag can read."""
+    with open(filename, 'w') as f:
+        json.dump(causalvis_dag(graph, treatment, outcome, name_mapping), f, indent=4)
+    print(f"causalvis DAG saved at: {filename}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='List graph archive runs or export one to causalvis JSON.')
+    parser.add_argument('archive', help='Graph archive file')
+    parser.add_argument('--run', default=None, help='Run id to export; lists the runs if omitted')
+    parser.add_argument('--output', default=None, help='causalvis JSON file (defaults to <run id>.json)')
+    parser.add_argument('--treatment', default=None, help='Treatment variable')
+    parser.add_argument('--outcome', default=None, help='Outcome variable')
+    parser.add_argument('--student_names', action='store_true', help='Map encoded student columns (e.g. internet_yes) to DAG names')
+    args = parser.parse_args()
+
+    with GraphArchive(args.archive) as archive:
+        if args.run is None:
+            for run in archive.runs:
+                print(run['run_id'], json.dumps(run['metadata']))
+        else:
+            name_mapping = None
+            if args.student_names:
+                from data_preparation import student_variable_mapping
+                name_mapping = {encoded: name for name, encoded in student_variable_mapping.items()}
+            export_causalvis(archive.to_networkx(args.run), args.output or f'{args.run}.json',
+                             treatment=args.treatment, outcome=args.outcome, name_mapping=name_mapping)
@@ -0,0 +1,283 @@
+import os
+import sys
+import time
+import pickle
+import socket
+import argparse
+import importlib
+import threading
+import traceback
+import multiprocessing
+from uuid import uuid4
+from concurrent.futures import ProcessPoolExecutor
+
+# Layout of a shared queue directory; a job moves pending -> running -> results by atomic renames
+PENDING, RUNNING, RESULTS, TMP = 'pending', 'running', 'results', 'tmp'
+STOP_FILE = 'stop'
+
+class LocalExecutor:
+    """
+    Runs jobs in a local process pool.
+
+    Args:
+        max_workers (int, optional): Number of worker processes (defaults to os.cpu_count()).
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+
+    def map(self, func, *iterables):
+        """Apply func to the zipped iterables and return the results in order."""
+        if self.max_workers == 1:
+            # A single worker runs in this process, without pickling the jobs
+            return list(map(func, *iterables))
+        with ProcessPoolExecutor(max_workers=self.max_workers or os.cpu_count()) as executor:
+            return list(executor.map(func, *iterables))
+
+def _make_queue_dirs(queue_dir):
+    for name in (PENDING, RUNNING, RESULTS, TMP):
+        os.makedirs(os.path.join(queue_dir, name), exist_ok=True)
+
+def _write_atomic(queue_dir, path, payload):
+    """Write payload to path so that readers only ever see the complete file."""
+    tmp_path = os.path.join(queue_dir, TMP, f'{uuid4().hex}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def _function_reference(func):
+    """(module, qualified name) of func, resolving a script's __main__ to its importable module name."""
+    module = func.__module__
+    if module == '__main__':
+        module = os.path.splitext(os.path.basename(sys.modules['__main__'].__file__))[0]
+    return module, func.__qualname__
+
+def _resolve_function(module, qualname):
+    func = importlib.import_module(module)
+    for part in qualname.split('.'):
+        func = getattr(func, part)
+    return func
+
+def requeue_stale_jobs(queue_dir, stale_after=60.0):
+    """
+    Move running jobs whose heartbeat is older than stale_after seconds back to pending.
+
+    Returns:
+        list: Ids of the requeued jobs.
+    """
+    running_dir = os.path.join(queue_dir, RUNNING)
+    now = time.time()
+    requeued = []
+    for name in os.listdir(running_dir):
+        path = os.path.join(running_dir, name)
+        try:
+            if now - os.path.getmtime(path) > stale_after:
+                os.rename(path, os.path.join(queue_dir, PENDING, name))
+                requeued.append(os.path.splitext(name)[0])
+        except FileNotFoundError:
+            pass  # Finished, or requeued by another process, in the meantime
+    return requeued
+
+class SharedDirectoryExecutor:
+    """
+    Runs jobs on any number of worker processes, on any hosts, that share a queue directory.
+
+    Each job is pickled into pending/. A worker claims it by renaming it into running/, which only
+    one worker can do, touches the running file as a heartbeat while the job runs, and publishes the
+    outcome in results/. Jobs whose heartbeat stops (a crashed or disconnected worker) are moved back
+    to pending/ and picked up again. Start workers with run_worker or
+    `python job_executor.py <queue_dir> --workers N`; the functions passed to map must be importable
+    on the worker hosts.
+
+    Args:
+        queue_dir (str): Shared directory, e.g. on NFS. Created if missing.
+        poll_interval (float): Seconds between checks for finished jobs.
+        stale_after (float): Seconds without a heartbeat after which a running job is requeued.
+            Keep it well above the workers' heartbeat interval and any clock skew between hosts.
+        timeout (float, optional): Seconds to wait for a map call before raising TimeoutError.
+    """
+
+    def __init__(self, queue_dir, poll_interval=0.5, stale_after=60.0, timeout=None):
+        self.queue_dir = queue_dir
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.timeout = timeout
+        _make_queue_dirs(queue_dir)
+
+    def map(self, func, *iterables):
+        """
+        Apply func to the zipped iterables on the workers and return the results in order.
+
+        Raises the exception of the first failed job (in submission order) once all jobs are done.
+        """
+        reference = _function_reference(func)
+        batch = uuid4().hex[:12]
+        job_ids = []
+        for i, args in enumerate(zip(*iterables)):
+            job_id = f'{batch}-{i:06d}'
+            _write_atomic(self.queue_dir, os.path.join(self.queue_dir, PENDING, f'{job_id}.pkl'),
+                          pickle.dumps((reference, args), protocol=pickle.HIGHEST_PROTOCOL))
+            job_ids.append(job_id)
+
+        start = time.monotonic()
+        outcomes = {}
+        while len(outcomes) < len(job_ids):
+            for job_id in job_ids:
+                path = os.path.join(self.queue_dir, RESULTS, f'{job_id}.pkl')
+                if job_id in outcomes or not os.path.exists(path):
+                    continue
+                with open(path, 'rb') as f:
+                    outcomes[job_id] = pickle.load(f)
+                os.remove(path)
+            if len(outcomes) == len(job_ids):
+                break
+            requeue_stale_jobs(self.queue_dir, self.stale_after)
+            if self.timeout is not None and time.monotonic() - start > self.timeout:
+                raise TimeoutError(f"{len(job_ids) - len(outcomes)} of {len(job_ids)} jobs unfinished "
+                                   f"after {self.timeout}s in {self.queue_dir}")
+            time.sleep(self.poll_interval)
+
+        # A requeued job can finish twice; drop any late duplicate result of this batch
+        for name in os.listdir(os.path.join(self.queue_dir, RESULTS)):
+            if name.startswith(batch):
+                try:
+                    os.remove(os.path.join(self.queue_dir, RESULTS, name))
+                except FileNotFoundError:
+                    pass
+
+        results = []
+        for job_id in job_ids:
+            status, value, worker, tb = outcomes[job_id]
+            if status == 'error':
+                print(f"Job {job_id} failed on {worker}:\n{tb}")
+                raise value
+            results.append(value)
+        return results
+
+def _heartbeat(path, interval, stop):
+    while not stop.wait(interval):
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return  # The job was requeued; its result is still published when it finishes
+
+def _claim_next_job(queue_dir):
+    """Claim a pending job by atomic rename. Returns (job_id, running path) or None."""
+    for name in sorted(os.listdir(os.path.join(queue_dir, PENDING))):
+        running_path = os.path.join(queue_dir, RUNNING, name)
+        try:
+            os.rename(os.path.join(queue_dir, PENDING, name), running_path)
+            # rename keeps the submission time as mtime; mark the claim as fresh before anyone checks it
+            os.utime(running_path)
+        except FileNotFoundError:
+            continue  # Another worker claimed it first
+        return os.path.splitext(name)[0], running_path
+    return None
+
+def run_worker(queue_dir, worker_id=None, poll_interval=0.5, heartbeat_interval=5.0, stale_after=60.0,
+               idle_timeout=None, max_jobs=None):
+    """
+    Pull and run jobs from a shared queue directory until stopped.
+
+    The worker exits when the queue directory contains a 'stop' file, after idle_timeout seconds
+    without a job, or after max_jobs jobs. While idle it also requeues jobs of dead workers.
+
+    Args:
+        queue_dir (str): Shared queue directory.
+        worker_id (str, optional): Name reported with results (defaults to host:pid).
+        poll_interval (float): Seconds between checks for pending jobs.
+        heartbeat_interval (float): Seconds between heartbeats of a running job.
+        stale_after (float): Seconds without a heartbeat after which a running job is requeued.
+        idle_timeout (float, optional): Exit after this many seconds without work.
+        max_jobs (int, optional): Exit after running this many jobs.
+
+    Returns:
+        int: Number of jobs run.
+    """
+    worker_id = worker_id or f'{socket.gethostname()}:{os.getpid()}'
+    _make_queue_dirs(queue_dir)
+    n_jobs = 0
+    idle_since = time.monotonic()
+    while not os.path.exists(os.path.join(queue_dir, STOP_FILE)):
+        if max_jobs is not None and n_jobs >= max_jobs:
+            break
+        claim = _claim_next_job(queue_dir)
+        if claim is None:
+            requeue_stale_jobs(queue_dir, stale_after)
+            if idle_timeout is not None and time.monotonic() - idle_since > idle_timeout:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        job_id, running_path = claim
+        try:
+            with open(running_path, 'rb') as f:
+                payload = f.read()
+        except FileNotFoundError:
+            continue  # Requeued between the claim and the read; another worker owns it now
+
+        stop = threading.Event()
+        beat = threading.Thread(target=_heartbeat, args=(running_path, heartbeat_interval, stop), daemon=True)
+        beat.start()
+        try:
+            reference, args = pickle.loads(payload)
+            outcome = ('ok', _resolve_function(*reference)(*args), worker_id, None)
+        except Exception as e:
+            outcome = ('error', e, worker_id, traceback.format_exc())
+        finally:
+            stop.set()
+            beat.join()
+
+        try:
+            result = pickle.dumps(outcome, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            result = pickle.dumps(('error', RuntimeError(f"Unpicklable result of job {job_id}"), worker_id,
+                                   outcome[3] or traceback.format_exc()))
+        _write_atomic(queue_dir, os.path.join(queue_dir, RESULTS, f'{job_id}.pkl'), result)
+        try:
+            os.remove(running_path)
+        except FileNotFoundError:
+            pass
+        n_jobs += 1
+        idle_since = time.monotonic()
+        print(f"Worker {worker_id} finished job {job_id} ({outcome[0]})")
+    return n_jobs
+
+def make_executor(queue_dir=None, n_jobs=None, **kwargs):
+    """SharedDirectoryExecutor on queue_dir if given, otherwise a LocalExecutor with n_jobs processes."""
+    if queue_dir:
+        return SharedDirectoryExecutor(queue_dir, **kwargs)
+    return LocalExecutor(max_workers=n_jobs)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run workers that pull jobs from a shared queue directory.')
+    parser.add_argument('queue_dir', help='Shared queue directory')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes to start on this host')
+    parser.add_argument('--idle_timeout', type=float, default=None, help='Exit after this many seconds without work')
+    parser.add_argument('--heartbeat', type=float, default=5.0, help='Seconds between heartbeats of a running job')
+    parser.add_argument('--stale_after', type=float, default=60.0, help='Seconds without a heartbeat before a job is requeued')
+    parser.add_argument('--stop', action='store_true', help='Ask all workers on the queue to exit, then return')
+    args = parser.parse_args()
+
+    if args.stop:
+        _make_queue_dirs(args.queue_dir)
+        open(os.path.join(args.queue_dir, STOP_FILE), 'w').close()
+        sys.exit(0)
+
+    # Starting workers explicitly overrides an earlier --stop
+    if os.path.exists(os.path.join(args.queue_dir, STOP_FILE)):
+        os.remove(os.path.join(args.queue_dir, STOP_FILE))
+    # Jobs import their functions by module name, so the repository must be importable from here
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    worker_kwargs = dict(heartbeat_interval=args.heartbeat, stale_after=args.stale_after, idle_timeout=args.idle_timeout)
+    if args.workers == 1:
+        run_worker(args.queue_dir, **worker_kwargs)
+    else:
+        processes = [multiprocessing.Process(target=run_worker, args=(args.queue_dir,), kwargs=worker_kwargs)
+                     for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
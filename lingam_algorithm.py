@@ -1,10 +1,19 @@
+import numpy as np
 from causallearn.search.FCMBased import lingam
 import networkx as nx
 from plotting_utils import plot_and_save_graph
+from lingam_pruning import GramPruningMixin
 
-def run_lingam_algorithm(data, labels):
-    model_lingam = lingam.ICALiNGAM(max_iter=500)
-    model_lingam.fit(data)
+class GramPrunedICALiNGAM(GramPruningMixin, lingam.ICALiNGAM):
+    """ICA-LiNGAM whose adaptive-lasso pruning is solved from one shared Gram matrix."""
+    # causallearn keeps the adaptive-lasso coefficients instead of refitting them by OLS
+    prune_refit = False
+
+def run_lingam_algorithm(data, labels, n_jobs=None, dtype=np.float64):
+    model_lingam = GramPrunedICALiNGAM(max_iter=500)
+    model_lingam.prune_n_jobs = n_jobs
+    # With dtype=np.float32, FastICA runs in float32; the pruning Gram matrix is accumulated in float64
+    model_lingam.fit(np.asarray(data, dtype=dtype))
     
     adjacency_matrix = model_lingam.adjacency_matrix_
 
@@ -17,6 +26,8 @@ def run_lingam_algorithm(data, labels):
 
     plot_and_save_graph(lingam_graph, labels, 'lingam_graph.png')
 
+    # Keep the adjacency matrix for GraphArchive, which reads the edge directions from it
+    lingam_graph.graph['adjacency_matrix'] = adjacency_matrix
     return lingam_graph
 
 if __name__ == "__main__":
@@ -0,0 +1,172 @@
+import numpy as np
+from math import log
+from concurrent.futures import ThreadPoolExecutor
+from sklearn.linear_model import lars_path_gram
+from data_preparation import centered_cross_product
+
+class AdaptiveLassoPruner:
+    """
+    Adaptive-lasso pruning of a causal order, solved from one shared Gram matrix.
+
+    The centered cross-product matrix of the data is computed once; every per-variable regression
+    (the OLS weights, the lasso path via LARS, the BIC selection and the final refit) then works on
+    sub-blocks of it, so no step touches the samples again. Each variable's LARS path covers every
+    regularization level, so adjacency matrices at several sparsity levels come from the same pass.
+    float32 data is reduced with float64 accumulation (data_preparation.centered_cross_product), so
+    every regression is solved in float64.
+
+    Args:
+        X (np.ndarray): Input data, shape (n_samples, n_features).
+        gamma (float): Exponent of the adaptive weights |b_ols| ** gamma.
+        refit (bool): If True, select on standardized data and refit the kept edges by OLS on the
+            original scale, as lingam's predict_adaptive_lasso; if False, return the adaptive-lasso
+            coefficients themselves, as causallearn's ICA-LiNGAM.
+        criterion (str): 'bic' or 'aic', as in sklearn's LassoLarsIC.
+    """
+
+    def __init__(self, X, gamma=1.0, refit=True, criterion='bic'):
+        self._set_cross_product(centered_cross_product(X), len(X), gamma, refit, criterion)
+
+    @classmethod
+    def from_cross_product(cls, cov, n_samples, gamma=1.0, refit=True, criterion='bic'):
+        """
+        Pruner for data known only through its centered cross-product matrix and row count, e.g.
+        sufficient statistics kept up to date as rows arrive.
+        """
+        pruner = cls.__new__(cls)
+        pruner._set_cross_product(np.asarray(cov, dtype=np.float64), n_samples, gamma, refit, criterion)
+        return pruner
+
+    def _set_cross_product(self, cov, n_samples, gamma, refit, criterion):
+        self.n_samples = n_samples
+        self.cov = cov
+        if refit:
+            scale = np.sqrt(np.diag(self.cov) / self.n_samples)
+            scale[scale == 0] = 1.0  # As sklearn's StandardScaler for constant columns
+            self.gram = self.cov / np.outer(scale, scale)
+        else:
+            self.gram = self.cov
+        self.gamma = gamma
+        self.refit = refit
+        self.criterion_factor = log(self.n_samples) if criterion == 'bic' else 2.0
+
+    def _path(self, target, predictors):
+        """LARS lasso path of target on the adaptively weighted predictors: (alphas, coefs, weight, ols)."""
+        G = self.gram[np.ix_(predictors, predictors)]
+        Xy = self.gram[predictors, target]
+        ols = np.linalg.lstsq(G, Xy, rcond=None)[0]
+        weight = np.abs(ols) ** self.gamma
+        alphas, _, coefs = lars_path_gram(Xy * weight, G * np.outer(weight, weight), n_samples=self.n_samples,
+                                          alpha_min=0.0, method='lasso', max_iter=500, eps=np.finfo(float).eps)
+        return alphas, coefs, weight, ols
+
+    def _finish(self, target, predictors, coef, weight):
+        """Coefficients on the scale requested by refit, for one column of the lasso path."""
+        coef = coef * weight
+        if not self.refit:
+            return coef
+        kept = np.abs(coef) > 0.0
+        result = np.zeros(len(predictors))
+        if kept.any():
+            selected = np.asarray(predictors)[kept]
+            result[kept] = np.linalg.lstsq(self.cov[np.ix_(selected, selected)], self.cov[selected, target],
+                                           rcond=None)[0]
+        return result
+
+    def prune(self, target, predictors):
+        """Pruned coefficients of target on predictors, with the level chosen by the information criterion."""
+        alphas, coefs, weight, ols = self._path(target, predictors)
+        G = self.gram[np.ix_(predictors, predictors)]
+        Xy = self.gram[predictors, target]
+        yy = self.gram[target, target]
+
+        # Residual sums of squares of every path point, from the Gram matrix (coefs are on the weighted scale)
+        b = coefs * weight[:, None]
+        rss = yy - 2 * b.T @ Xy + np.einsum('ik,ij,jk->k', b, G, b)
+        noise_variance = (yy - ols @ Xy) / (self.n_samples - len(predictors) - 1)
+        dof = np.sum(np.abs(coefs) > np.finfo(float).eps, axis=0)
+        criterion = (self.n_samples * np.log(2 * np.pi * noise_variance) + rss / noise_variance
+                     + self.criterion_factor * dof)
+        return self._finish(target, predictors, coefs[:, np.argmin(criterion)], weight)
+
+    def prune_path(self, target, predictors, alphas):
+        """
+        Pruned coefficients of target at each regularization level, read off one LARS path.
+
+        Args:
+            alphas (array-like): Regularization levels on sklearn's Lasso scale.
+
+        Returns:
+            np.ndarray: Coefficients, shape (len(alphas), len(predictors)).
+        """
+        path_alphas, coefs, weight, _ = self._path(target, predictors)
+        # The lasso path is piecewise linear in alpha between the LARS knots (path_alphas is decreasing)
+        at_levels = np.array([np.interp(-np.asarray(alphas), -path_alphas, row) for row in coefs]).T
+        return np.array([self._finish(target, predictors, coef, weight) for coef in at_levels])
+
+    def _regressions(self, causal_order, prior_knowledge):
+        if prior_knowledge is not None:
+            pk = prior_knowledge.copy()
+            np.fill_diagonal(pk, 0)
+        for k in range(1, len(causal_order)):
+            target, predictors = causal_order[k], list(causal_order[:k])
+            # Exclude variables specified in no_path with prior knowledge
+            if prior_knowledge is not None:
+                predictors = [p for p in predictors if pk[target, p] != 0]
+            if predictors:
+                yield target, predictors
+
+    def adjacency_matrix(self, causal_order, prior_knowledge=None, n_jobs=None):
+        """
+        Adjacency matrix for a causal order, with the per-variable regressions run in a thread pool.
+
+        Args:
+            causal_order (list): Column indices in causal order.
+            prior_knowledge (np.ndarray, optional): lingam prior knowledge matrix (0 forbids a path).
+            n_jobs (int, optional): Number of threads; regressions run serially if None or 1.
+
+        Returns:
+            np.ndarray: B with B[i, j] the effect of x_j on x_i.
+        """
+        regressions = list(self._regressions(causal_order, prior_knowledge))
+        B = np.zeros(self.gram.shape)
+        for (target, predictors), coef in zip(regressions, self._map(self.prune, regressions, n_jobs)):
+            B[target, predictors] = coef
+        return B
+
+    def adjacency_path(self, causal_order, alphas, prior_knowledge=None, n_jobs=None):
+        """
+        Adjacency matrices at several regularization levels from one pass over the regressions.
+
+        Returns:
+            np.ndarray: Shape (len(alphas), n_features, n_features); larger alphas give sparser graphs.
+        """
+        regressions = list(self._regressions(causal_order, prior_knowledge))
+        B = np.zeros((len(alphas),) + self.gram.shape)
+        tasks = [(target, predictors, alphas) for target, predictors in regressions]
+        for (target, predictors), coefs in zip(regressions, self._map(self.prune_path, tasks, n_jobs)):
+            B[:, target, predictors] = coefs
+        return B
+
+    @staticmethod
+    def _map(func, tasks, n_jobs):
+        if not n_jobs or n_jobs == 1:
+            return [func(*task) for task in tasks]
+        # The regressions only share the read-only Gram matrix; LAPACK calls release the GIL
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            return list(executor.map(lambda task: func(*task), tasks))
+
+class GramPruningMixin:
+    """
+    Replaces the serial adaptive-lasso loop of lingam / causallearn LiNGAM models with AdaptiveLassoPruner.
+
+    Put it before the model class in the bases; set prune_refit to False for causallearn's ICA-LiNGAM.
+    """
+    prune_refit = True
+    prune_n_jobs = None
+
+    def _estimate_adjacency_matrix(self, X, prior_knowledge=None):
+        pruner = AdaptiveLassoPruner(X, refit=self.prune_refit)
+        self._adjacency_matrix = pruner.adjacency_matrix(self._causal_order, prior_knowledge=prior_knowledge,
+                                                         n_jobs=self.prune_n_jobs)
+        return self
@@ -2,16 +2,41 @@ import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 import sys
+import functools
 import argparse
+import numpy as np
 from data_preparation import load_and_prepare_student_data, load_and_prepare_adult_data
-from pc_algorithm import run_pc_algorithm
+from pc_algorithm import run_pc_algorithm, run_anytime_pc_algorithm
 from lingam_algorithm import run_lingam_algorithm
 from direct_lingam import run_direct_lingam
 from true_graph import create_true_graph_student, create_true_graph_adult
 from evaluation import evaluate_graph
+from ensemble_discovery import run_ensemble
+from graph_archive import GraphArchive
 
-def run_algorithms_for_dataset(data_preparation_func, true_graph_func, file_path, dataset_name, measure):
-    df_encoded, labels, data = data_preparation_func(file_path)
+def run_ensemble_for_dataset(data_preparation_func, true_graph_func, file_path, dataset_name, threshold, dtype=np.float64):
+    df_encoded, labels, data = data_preparation_func(file_path, dtype=dtype)
+
+    print(f"\nRunning ensemble discovery on the {dataset_name} dataset...")
+    graph, agreement, votes = run_ensemble(data, labels, threshold=threshold, dtype=dtype)
+    for u, v, attrs in graph.edges(data=True):
+        print(f"{u} -> {v}: agreement {attrs['agreement']:.2f}")
+
+    if true_graph_func:
+        shd, recall, precision = evaluate_graph(graph, true_graph_func())
+        print(f"Ensemble consensus ({', '.join(votes)}) - SHD: {shd}, Recall: {recall}, Precision: {precision}")
+
+def run_budgeted_pc(data, labels, **budget):
+    graph, report = run_anytime_pc_algorithm(data, labels, **budget)
+    if report['untested_edges']:
+        print(f"PC stopped by {report['stopped_by']}; edges not fully tested:")
+        for u, v in report['untested_edges']:
+            print(f"  {u} - {v}")
+    return graph
+
+def run_algorithms_for_dataset(data_preparation_func, true_graph_func, file_path, dataset_name, measure, pc_budget=None,
+                               archive_path=None, dtype=np.float64):
+    df_encoded, labels, data = data_preparation_func(file_path, dtype=dtype)
     print(f"{dataset_name.capitalize()} Data Preparation:")
     print(df_encoded.dtypes)
     print("Missing values:\n", df_encoded.isnull().sum())
@@ -21,7 +46,7 @@ def run_algorithms_for_dataset(data_preparation_func, true_graph_func, file_path
 
     # Run Algorithms
     algorithms = {
-        "PC": run_pc_algorithm,
+        "PC": functools.partial(run_budgeted_pc, **pc_budget) if pc_budget else run_pc_algorithm,
         "LiNGAM": run_lingam_algorithm,
         "DirectLiNGAM": run_direct_lingam
     }
@@ -30,15 +55,24 @@ def run_algorithms_for_dataset(data_preparation_func, true_graph_func, file_path
         print(f"\nRunning {algo_name} algorithm...")
         try:
             if algo_name == "DirectLiNGAM":
-                graph = algo_func(data, labels, measure=measure)  # Pass the measure parameter
+                graph = algo_func(data, labels, measure=measure, dtype=dtype)  # Pass the measure parameter
             else:
-                graph = algo_func(data, labels)
+                graph = algo_func(data, labels, dtype=dtype)
             if graph is not None:  # Check if graph creation was successful
                 graphs[algo_name] = graph
         except Exception as e:
             print(f"Error running {algo_name} algorithm: {e}")
         input("Press Enter to continue...")  # Pause until Enter is pressed
 
+    # Keep the discovered graphs for export to causalvis (see graph_archive.py)
+    if archive_path:
+        with GraphArchive(archive_path, labels=labels, mode='a') as archive:
+            for algo_name, graph in graphs.items():
+                run_id = f"{dataset_name}_{algo_name}_{len(archive)}"
+                archive.append(run_id, graph, dataset=dataset_name, algorithm=algo_name, measure=measure,
+                               dtype=np.dtype(dtype).name)
+                print(f"Archived {algo_name} graph as {run_id} in {archive_path}")
+
     if true_graph_func:
         G_true = true_graph_func()
         for algo_name, graph in graphs.items():
@@ -51,8 +85,16 @@ def run_algorithms_for_dataset(data_preparation_func, true_graph_func, file_path
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run Causal Discovery Algorithms on a specified dataset.')
     parser.add_argument('--dataset', required=True, choices=['student', 'adult'], help='Dataset to use (student or adult)')
-    parser.add_argument('--measure', required=False, default='pwling', help='Measure to use for DirectLiNGAM (pwling, kernel, pwling_fast)')
+    parser.add_argument('--measure', required=False, default='pwling', help='Measure to use for DirectLiNGAM (pwling, kernel, kernel_approx, pwling_fast)')
+    parser.add_argument('--ensemble', action='store_true', help='Run all algorithms on shared preprocessing and print their consensus graph')
+    parser.add_argument('--threshold', type=float, default=0.5, help='Minimum agreement for a consensus edge (with --ensemble)')
+    parser.add_argument('--time_budget', type=float, default=None, help='Seconds of PC skeleton search before returning a partial graph')
+    parser.add_argument('--max_depth', type=int, default=None, help='Largest PC conditioning-set size')
+    parser.add_argument('--max_neighbours', type=int, default=None, help='Neighbours per node that PC draws conditioning sets from')
+    parser.add_argument('--archive', default=None, help='Graph archive file to append the discovered graphs to')
+    parser.add_argument('--float32', action='store_true', help='Load and run the algorithms in float32 (float64 accumulation where needed)')
     args = parser.parse_args()
+    dtype = np.float32 if args.float32 else np.float64
 
     datasets = {
         'student': {
@@ -69,13 +111,26 @@ if __name__ == "__main__":
 
     # Get the configuration for the selected dataset
     dataset_config = datasets.get(args.dataset)
-    if dataset_config:
+    if dataset_config and args.ensemble:
+        run_ensemble_for_dataset(
+            dataset_config["data_preparation_func"],
+            dataset_config["true_graph_func"],
+            dataset_config["file_path"],
+            args.dataset,
+            args.threshold,
+            dtype=dtype
+        )
+    elif dataset_config:
         run_algorithms_for_dataset(
             dataset_config["data_preparation_func"],
             dataset_config["true_graph_func"],
             dataset_config["file_path"],
             args.dataset,
-            args.measure  # Pass the measure argument
+            args.measure,  # Pass the measure argument
+            {key: value for key, value in [('time_budget', args.time_budget), ('max_depth', args.max_depth),
+                                           ('max_neighbours', args.max_neighbours)] if value is not None},
+            archive_path=args.archive,
+            dtype=dtype
         )
     else:
         print(f"Invalid dataset argument: {args.dataset}")
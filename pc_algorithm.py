@@ -1,38 +1,209 @@
 import os
+import time
+import numpy as np
 import networkx as nx
+from itertools import combinations
 from causallearn.search.ConstraintBased.PC import pc
-from causallearn.utils.cit import fisherz
+from causallearn.graph.GraphClass import CausalGraph
+from causallearn.utils.cit import CIT, fisherz
+from causallearn.utils.PCUtils import Meek, UCSepset
+from causallearn.utils.PCUtils.Helper import append_value
+# Importing ci_tests also registers its fast_gsq and fast_chisq tests with causallearn
+from ci_tests import shared_fisherz
+from data_preparation import correlation_matrix as float64_correlation
 from plotting_utils import causal_learn_to_networkx, plot_and_save_graph
 
-def run_pc_algorithm(data, labels, alpha=0.1, stable=False, uc_rule=2, output_dir='output'):
-    """Runs the PC algorithm and returns the estimated causal graph."""
-    # Convert boolean columns to integers
-    data = data.astype(float)
+def _save_pc_graph(cg_pc, labels, output_dir, filename):
+    """Converts a causallearn graph to a NetworkX DiGraph, then plots and saves it."""
+    # Convert CausalLearn GeneralGraph to NetworkX DiGraph using the utility function
+    nx_graph = causal_learn_to_networkx(cg_pc.G)
 
-    try:
-        print(f"Running PC algorithm with alpha={alpha}, stable={stable}, uc_rule={uc_rule}")
-        cg_pc = pc(data, alpha=alpha, stable=stable, uc_rule=uc_rule, indep_test=fisherz)
+    # Ensure the graph is a DAG by removing bidirectional edges
+    bidirectional_edges = [(u, v) for u, v in nx_graph.edges if nx_graph.has_edge(v, u)]
+    for u, v in bidirectional_edges:
+        nx_graph.remove_edge(v, u)
+
+    # Ensure output directory exists
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    # Define the full path for the output file
+    filename = os.path.join(output_dir, filename)
 
-        # Convert CausalLearn GeneralGraph to NetworkX DiGraph using the utility function
-        nx_graph = causal_learn_to_networkx(cg_pc.G)
+    # Use the updated plot_and_save_graph function to save the graph
+    plot_and_save_graph(nx_graph, labels, filename)
 
-        # Ensure the graph is a DAG by removing bidirectional edges
-        bidirectional_edges = [(u, v) for u, v in nx_graph.edges if nx_graph.has_edge(v, u)]
-        for u, v in bidirectional_edges:
-            nx_graph.remove_edge(v, u)
+    print(f"Graph saved at: {filename}")
+    # Keep causallearn's graph, with its undirected edges, for GraphArchive
+    nx_graph.graph['general_graph'] = cg_pc.G
+    return nx_graph
 
-        # Ensure output directory exists
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+def prepare_ci_test(data, indep_test=fisherz, dtype=np.float64):
+    """Data in the compute dtype and the CI test to run on it, with its keyword arguments.
 
-        # Define the full path for the output file
-        filename = os.path.join(output_dir, 'pc_graph.png')
+    In float32 mode Fisher-z runs as shared_fisherz on a correlation matrix accumulated in float64,
+    because causallearn's fisherz would promote the whole data matrix back to float64.
+    """
+    # Plain view of the data; only copies if the loader did not already produce this dtype
+    data = np.asarray(data, dtype=dtype)
+    if data.dtype == np.float32 and indep_test == fisherz:
+        return data, shared_fisherz, {'correlation_matrix': float64_correlation(data)}
+    return data, indep_test, {}
 
-        # Use the updated plot_and_save_graph function to save the graph
-        plot_and_save_graph(nx_graph, labels, filename)
+def run_pc_algorithm(data, labels, alpha=0.1, stable=False, uc_rule=2, output_dir='output', indep_test=fisherz,
+                     dtype=np.float64):
+    """Runs the PC algorithm and returns the estimated causal graph.
 
-        print(f"Graph saved at: {filename}")
-        return nx_graph
+    indep_test may be fisherz, or fast_gsq / fast_chisq for the discrete tests in ci_tests.
+    dtype=np.float32 selects the float32 compute mode.
+    """
+    data, indep_test, test_kwargs = prepare_ci_test(data, indep_test, dtype)
+
+    try:
+        print(f"Running PC algorithm with alpha={alpha}, stable={stable}, uc_rule={uc_rule}, indep_test={indep_test}")
+        cg_pc = pc(data, alpha=alpha, stable=stable, uc_rule=uc_rule, indep_test=indep_test, **test_kwargs)
+        return _save_pc_graph(cg_pc, labels, output_dir, 'pc_graph.png')
     except Exception as e:
         print(f"Error running PC algorithm: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def anytime_skeleton(cit, n_vars, alpha, stable=False, time_budget=None, max_depth=None, max_neighbours=None):
+    """
+    PC skeleton discovery that stops at a wall-clock budget or depth limit with a usable skeleton.
+
+    Args:
+        cit (CIT_Base): causallearn CI test built on the data, e.g. CIT(data, fisherz).
+        n_vars (int): Number of variables.
+        alpha (float): Significance level of the independence tests.
+        stable (bool): Remove edges only after each depth is finished (order-independent).
+        time_budget (float, optional): Seconds after which no further tests are started.
+        max_depth (int, optional): Largest conditioning-set size to test.
+        max_neighbours (int, optional): Conditioning sets for an edge x - y are drawn from at most this
+            many neighbours of x, preferring those most strongly associated with x.
+
+    Returns:
+        tuple: (adjacency as a list of sets, dict of (x, y) to a list of separating sets, set of (x, y) edges with x < y
+            that were not fully tested, stop reason: 'converged', 'time' or 'depth', number of tests run)
+    """
+    deadline = None if time_budget is None else time.monotonic() + time_budget
+    adj = [set(range(n_vars)) - {i} for i in range(n_vars)]
+    sepset = {}
+    marginal_p = np.zeros((n_vars, n_vars))
+    # done[x][y]: largest depth at which every conditioning set from x's side of x - y was tested
+    done = [dict.fromkeys(adj[x], -1) for x in range(n_vars)]
+
+    def remove(x, y, S):
+        adj[x].discard(y)
+        adj[y].discard(x)
+        sepset.setdefault((x, y), []).append(tuple(S))
+        sepset.setdefault((y, x), []).append(tuple(S))
+
+    reason = 'converged'
+    n_tests = 0
+    depth = -1
+    while max(len(a) for a in adj) - 1 > depth:
+        depth += 1
+        if max_depth is not None and depth > max_depth:
+            reason = 'depth'
+            break
+        removals = []
+        for x in range(n_vars):
+            # As in causallearn, conditioning sets for x come from its neighbours when x is reached
+            neigh_x = sorted(adj[x])
+            for y in neigh_x:
+                candidates = [v for v in neigh_x if v != y]
+                truncated = max_neighbours is not None and len(candidates) > max_neighbours
+                if truncated:
+                    candidates = sorted(sorted(candidates, key=lambda v: marginal_p[x, v])[:max_neighbours])
+                independent = False
+                sepsets = set()
+                for S in combinations(candidates, depth):
+                    if deadline is not None and time.monotonic() > deadline:
+                        reason = 'time'
+                        break
+                    p = cit(x, y, S)
+                    n_tests += 1
+                    if depth == 0:
+                        marginal_p[x, y] = marginal_p[y, x] = p
+                    if p > alpha:
+                        independent = True
+                        if not stable:
+                            remove(x, y, S)
+                            break
+                        # Stable mode keeps testing and records the union of separating sets
+                        sepsets.update(S)
+                if independent and stable:
+                    removals.append((x, y, tuple(sepsets)))
+                if reason == 'time':
+                    break
+                if not truncated and done[x].get(y) == depth - 1:
+                    done[x][y] = depth
+            if reason == 'time':
+                break
+        for x, y, S in removals:
+            remove(x, y, S)
+        if reason == 'time':
+            break
+
+    # An edge is fully tested when every subset of both endpoints' remaining neighbours was tried
+    untested = {(min(x, y), max(x, y)) for x in range(n_vars) for y in adj[x]
+                if done[x][y] < len(adj[x]) - 1 or done[y][x] < len(adj[y]) - 1}
+    return adj, sepset, untested, reason, n_tests
+
+def run_anytime_pc_algorithm(data, labels, alpha=0.1, stable=False, uc_rule=2, output_dir='output', indep_test=fisherz,
+                             time_budget=None, max_depth=None, max_neighbours=None, dtype=np.float64):
+    """
+    Runs a budgeted PC algorithm that always returns an oriented graph on time.
+
+    Skeleton search stops when the wall-clock budget or depth limit is reached, and conditioning sets
+    are capped to max_neighbours neighbours per node. Orientation then runs on the current skeleton;
+    if the budget ran out, the test-free sepset collider rule is used instead of uc_rule 1 or 2.
+    dtype=np.float32 selects the float32 compute mode, as in run_pc_algorithm.
+
+    Returns:
+        tuple: (nx.DiGraph, report dict with 'stopped_by', 'untested_edges' (label pairs whose
+            conditioning sets were not exhausted), 'n_tests' and 'elapsed')
+    """
+    data, indep_test, test_kwargs = prepare_ci_test(data, indep_test, dtype)
+    start = time.monotonic()
+    try:
+        print(f"Running anytime PC with alpha={alpha}, time_budget={time_budget}, max_depth={max_depth}, "
+              f"max_neighbours={max_neighbours}, indep_test={indep_test}")
+        cit = CIT(data, indep_test, **test_kwargs)
+        adj, sepset, untested, reason, n_tests = anytime_skeleton(cit, data.shape[1], alpha, stable=stable,
+                                                                  time_budget=time_budget, max_depth=max_depth,
+                                                                  max_neighbours=max_neighbours)
+
+        # Orientation reuses the skeleton's test (and its p-value cache) for uc_rule 1 and 2
+        cg = CausalGraph(data.shape[1])
+        cg.set_ind_test(cit)
+        nodes = cg.G.get_nodes()
+        for x in range(data.shape[1]):
+            for y in range(x + 1, data.shape[1]):
+                if y not in adj[x]:
+                    cg.G.remove_edge(cg.G.get_edge(nodes[x], nodes[y]))
+                    for S in sepset[(x, y)]:
+                        append_value(cg.sepset, x, y, S)
+                        append_value(cg.sepset, y, x, S)
+
+        # uc_priority 2 (prioritize existing colliders), as in causallearn's pc
+        if reason == 'time' or uc_rule == 0:
+            cg = Meek.meek(UCSepset.uc_sepset(cg, 2))
+        elif uc_rule == 1:
+            cg = Meek.meek(UCSepset.maxp(cg, 2))
+        else:
+            cg = Meek.meek(Meek.definite_meek(UCSepset.definite_maxp(cg, alpha, 2)))
+
+        nx_graph = _save_pc_graph(cg, labels, output_dir, 'pc_anytime_graph.png')
+        report = {
+            'stopped_by': reason,
+            'untested_edges': sorted((labels[x], labels[y]) for x, y in untested),
+            'n_tests': n_tests,
+            'elapsed': time.monotonic() - start,
+        }
+        print(f"Anytime PC stopped by {reason} after {report['elapsed']:.1f}s; "
+              f"{len(untested)} edges not fully tested")
+        return nx_graph, report
+    except Exception as e:
+        print(f"Error running anytime PC algorithm: {e}")
+        raise
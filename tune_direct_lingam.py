@@ -2,26 +2,42 @@ import numpy as np
 import traceback
 import networkx as nx
 from evaluation import evaluate_graph
-from sklearn.model_selection import KFold
 import argparse
 import os
 from plotting_utils import plot_and_save_graph
 from direct_lingam import run_direct_lingam  # Importing the function from direct_lingam.py
+from job_executor import make_executor
+from sklearn.model_selection import KFold
 
-def run_direct_lingam_default(data, labels, output_dir='output'):
+def run_direct_lingam_default(data, labels, output_dir='output', dtype=np.float64):
     """
     Run the DirectLiNGAM algorithm with default parameters.
 
     Parameters:
     data (pd.DataFrame): The input data for causal discovery.
     labels (list): List of labels for the data columns.
+    dtype (np.dtype): Compute dtype (np.float32 for the float32 mode).
 
     Returns:
     graph: The adjacency matrix representing the causal graph.
     """
-    return run_direct_lingam(data, labels, measure=None, output_dir=output_dir)
-
-def grid_search_direct_lingam(data, labels, true_graph, n_splits=5, output_dir="output"):
+    return run_direct_lingam(data, labels, measure=None, output_dir=output_dir, dtype=dtype)
+
+def evaluate_direct_lingam_fold(train_data, labels, true_graph, measure, output_dir="output", dtype=np.float64):
+    """SHD of the DirectLiNGAM graph fitted on one training fold, or None on error."""
+    try:
+        if measure == 'default':
+            nx_graph = run_direct_lingam_default(train_data, labels, output_dir=output_dir, dtype=dtype)
+        else:
+            nx_graph = run_direct_lingam(train_data, labels, measure=measure, output_dir=output_dir, dtype=dtype)
+        shd, recall, precision = evaluate_graph(nx_graph, true_graph)
+        return shd  # Using SHD as the score metric
+    except Exception as e:
+        print(f"Error with params: measure={measure} - {str(e)}")
+        traceback.print_exc()  # Print the full traceback for detailed debugging
+        return None
+
+def grid_search_direct_lingam(data, labels, true_graph, n_splits=5, output_dir="output", executor=None, dtype=np.float64):
     param_grid = {
         'measure': ['default', 'pwling', 'pwling_fast']
     }
@@ -31,25 +47,28 @@ def grid_search_direct_lingam(data, labels, true_graph, n_splits=5, output_dir="
 
     # Set a consistent random seed for reproducibility
     np.random.seed(42)
-    kf = KFold(n_splits=n_splits, shuffle=True, random_state=42)
 
-    for measure in param_grid['measure']:
-        cv_scores = []
-
-        for train_index, test_index in kf.split(data):
-            train_data, test_data = data[train_index], data[test_index]
+    kf = KFold(n_splits=n_splits, shuffle=True, random_state=42)
 
-            try:
-                if measure == 'default':
-                    nx_graph = run_direct_lingam_default(train_data, labels, output_dir=output_dir)
-                else:
-                    nx_graph = run_direct_lingam(train_data, labels, measure=measure, output_dir=output_dir)
-                shd, recall, precision = evaluate_graph(nx_graph, true_graph)
-                cv_scores.append(shd)  # Using SHD as the score metric
+    fold_scores = {}
+    if executor is not None:
+        # Jobs may run on other hosts, so each one carries its own copy of the training rows
+        train_folds = [data[train_index] for train_index, test_index in kf.split(data)]
+        trials = [(measure, train_data) for measure in param_grid['measure'] for train_data in train_folds]
+        n = len(trials)
+        shds = executor.map(evaluate_direct_lingam_fold, [train for _, train in trials], [labels] * n,
+                            [true_graph] * n, [measure for measure, _ in trials], [output_dir] * n, [dtype] * n)
+        for (measure, _), shd in zip(trials, shds):
+            fold_scores.setdefault(measure, []).append(shd)
 
-            except Exception as e:
-                print(f"Error with params: measure={measure} - {str(e)}")
-                traceback.print_exc()  # Print the full traceback for detailed debugging
+    for measure in param_grid['measure']:
+        if executor is not None:
+            cv_scores = fold_scores[measure]
+        else:
+            cv_scores = [evaluate_direct_lingam_fold(data[train_index], labels, true_graph, measure,
+                                                     output_dir=output_dir, dtype=dtype)
+                         for train_index, test_index in kf.split(data)]
+        cv_scores = [shd for shd in cv_scores if shd is not None]
 
         avg_score = np.mean(cv_scores)
         if avg_score < best_score:
@@ -65,14 +84,18 @@ def grid_search_direct_lingam(data, labels, true_graph, n_splits=5, output_dir="
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Tune DirectLiNGAM Algorithm")
     parser.add_argument('--dataset', choices=['student', 'adult'], required=True, help='Dataset to use (student or adult)')
+    parser.add_argument('--queue_dir', default=None, help='Shared queue directory; folds run on job_executor workers')
+    parser.add_argument('--n_jobs', type=int, default=1, help='Local worker processes for the folds (without --queue_dir)')
+    parser.add_argument('--float32', action='store_true', help='Load and fit in float32 (float64 accumulation where needed)')
     args = parser.parse_args()
+    dtype = np.float32 if args.float32 else np.float64
 
     if args.dataset == 'student':
         from data_preparation import load_and_prepare_student_data
         from true_graph import create_true_graph_student
         
         file_path = 'data/student-por_raw.csv'
-        df_encoded, labels, data = load_and_prepare_student_data(file_path)
+        df_encoded, labels, data = load_and_prepare_student_data(file_path, dtype=dtype)
         true_graph = create_true_graph_student()
         output_dir = 'output/student_DAGS'
     elif args.dataset == 'adult':
@@ -80,11 +103,12 @@ if __name__ == "__main__":
         from true_graph import create_true_graph_adult
         
         file_path = 'data/adult_cleaned.csv'
-        df_encoded, labels, data = load_and_prepare_adult_data(file_path)
+        df_encoded, labels, data = load_and_prepare_adult_data(file_path, dtype=dtype)
         true_graph = create_true_graph_adult()
         output_dir = 'output/adult_DAGS'
     
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    grid_search_direct_lingam(data, labels, true_graph, output_dir=output_dir)
+    executor = make_executor(args.queue_dir, args.n_jobs)
+    grid_search_direct_lingam(data, labels, true_graph, output_dir=output_dir, executor=executor, dtype=dtype)
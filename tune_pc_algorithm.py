@@ -4,23 +4,28 @@ import os
 import sys
 from causallearn.search.ConstraintBased.PC import pc
 from causallearn.utils.cit import fisherz
+from ci_tests import fast_gsq, fast_chisq
 from data_preparation import load_and_prepare_student_data, load_and_prepare_adult_data
 from true_graph import create_true_graph_student, create_true_graph_adult
 from evaluation import evaluate_graph
 from plotting_utils import plot_and_save_graph, causal_learn_to_networkx
+from job_executor import make_executor
+from pc_algorithm import prepare_ci_test
 import traceback
 
 # Function to run the PC algorithm with specific parameters
-def run_pc_with_params(data, labels, alpha, stable, uc_rule, output_dir):
+def run_pc_with_params(data, labels, alpha, stable, uc_rule, output_dir, indep_test=fisherz, dtype=np.float64):
     try:
-        print(f"Running PC with alpha={alpha}, stable={stable}, uc_rule={uc_rule}")
-        cg_pc = pc(data, alpha=alpha, indep_test=fisherz, stable=stable, uc_rule=uc_rule)
+        print(f"Running PC with alpha={alpha}, stable={stable}, uc_rule={uc_rule}, indep_test={indep_test}")
+        # causallearn requires a plain ndarray, not the loaders' DataMatrix subclass
+        test_data, test, test_kwargs = prepare_ci_test(data, indep_test, dtype)
+        cg_pc = pc(test_data, alpha=alpha, indep_test=test, stable=stable, uc_rule=uc_rule, **test_kwargs)
 
         # Convert CausalLearn Graph to NetworkX graph
         nx_graph = causal_learn_to_networkx(cg_pc.G)
 
         # Plot and save the graph
-        filename = f'pc_graph_alpha_{alpha}_stable_{stable}_uc_rule_{uc_rule}.png'
+        filename = f'pc_graph_{indep_test}_alpha_{alpha}_stable_{stable}_uc_rule_{uc_rule}.png'
         filepath = os.path.join(output_dir, filename)
         plot_and_save_graph(nx_graph, labels, filepath)
 
@@ -30,52 +35,81 @@ def run_pc_with_params(data, labels, alpha, stable, uc_rule, output_dir):
         traceback.print_exc()  # Print the full traceback for detailed debugging
         raise
 
+# Function to run and score one parameter combination; returns (shd, recall, precision), or None on error
+def evaluate_pc_params(data, labels, true_graph, params, output_dir, indep_test=fisherz, dtype=np.float64):
+    try:
+        nx_graph = run_pc_with_params(data, labels, params['alpha'], params['stable'], params['uc_rule'], output_dir,
+                                      indep_test=indep_test, dtype=dtype)
+        return evaluate_graph(nx_graph, true_graph)
+    except Exception as e:
+        print(f"Error with params: alpha={params['alpha']}, stable={params['stable']}, uc_rule={params['uc_rule']} - {str(e)}")
+        traceback.print_exc()  # Print the full traceback for detailed debugging
+        return None
+
 # Function to perform grid search for PC algorithm
-def grid_search_pc(data, labels, true_graph, output_dir):
+def grid_search_pc(data, labels, true_graph, output_dir, indep_test=fisherz, executor=None, dtype=np.float64):
+    """Grid search over PC parameters. Trials run through executor.map if an executor is given.
+
+    dtype=np.float32 runs every trial in the float32 compute mode of pc_algorithm.prepare_ci_test.
+    """
     param_grid = {
         'alpha': [0.01, 0.05, 0.1],
         'stable': [True, False],
         'uc_rule': [0, 1, 2]
     }
+    trials = [{'alpha': alpha, 'stable': stable, 'uc_rule': uc_rule}
+              for alpha in param_grid['alpha'] for stable in param_grid['stable'] for uc_rule in param_grid['uc_rule']]
 
     best_params = None
     best_score = float('inf')
 
-    for alpha in param_grid['alpha']:
-        for stable in param_grid['stable']:
-            for uc_rule in param_grid['uc_rule']:
-                try:
-                    nx_graph = run_pc_with_params(data, labels, alpha, stable, uc_rule, output_dir)
-                    shd, recall, precision = evaluate_graph(nx_graph, true_graph)
-                    score = shd  # Using SHD as the score metric
-
-                    if score < best_score:
-                        best_score = score
-                        best_params = {'alpha': alpha, 'stable': stable, 'uc_rule': uc_rule}
+    run = executor.map if executor is not None else map
+    n = len(trials)
+    scores = run(evaluate_pc_params, [data] * n, [labels] * n, [true_graph] * n, trials, [output_dir] * n, [indep_test] * n,
+                 [dtype] * n)
+    for params, score in zip(trials, scores):
+        if score is None:
+            continue
+        shd, recall, precision = score
+        if shd < best_score:  # Using SHD as the score metric
+            best_score = shd
+            best_params = params
 
-                    print(f"Params: alpha={alpha}, stable={stable}, uc_rule={uc_rule} - SHD: {shd}, Recall: {recall}, Precision: {precision}")
-                except Exception as e:
-                    print(f"Error with params: alpha={alpha}, stable={stable}, uc_rule={uc_rule} - {str(e)}")
-                    traceback.print_exc()  # Print the full traceback for detailed debugging
+        print(f"Params: alpha={params['alpha']}, stable={params['stable']}, uc_rule={params['uc_rule']} - SHD: {shd}, Recall: {recall}, Precision: {precision}")
 
     print(f"Best parameters for PC Algorithm: {best_params}")
     print(f"Best score: {best_score}")
 
 # Main function to load data and perform grid search
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python tune_pc_algorithm.py <dataset>")
+    # --float32 may appear anywhere; the remaining arguments are positional
+    dtype = np.float32 if '--float32' in sys.argv else np.float64
+    argv = [arg for arg in sys.argv if arg != '--float32']
+    # --n_jobs N runs the trials in N local processes when no queue directory is given
+    n_jobs = 1
+    if '--n_jobs' in argv:
+        i = argv.index('--n_jobs')
+        n_jobs = int(argv[i + 1])
+        del argv[i:i + 2]
+    if len(argv) < 2:
+        print("Usage: python tune_pc_algorithm.py <dataset> [fisherz|fast_gsq|fast_chisq] [queue_dir] [--float32] [--n_jobs N]")
         sys.exit(1)
 
-    dataset = sys.argv[1]
+    dataset = argv[1]
+    indep_test = argv[2] if len(argv) > 2 else fisherz
+    if indep_test not in (fisherz, fast_gsq, fast_chisq):
+        print(f"Invalid indep_test argument: {indep_test}")
+        sys.exit(1)
+    # With a queue directory, trials are pulled by `python job_executor.py <queue_dir>` workers on any host
+    executor = make_executor(argv[3] if len(argv) > 3 else None, n_jobs)
     if dataset == 'student':
         file_path = r'C:\Users\adams\OneDrive\Desktop\causal test\data\student-por_raw.csv'
-        df_encoded, labels, data = load_and_prepare_student_data(file_path)
+        df_encoded, labels, data = load_and_prepare_student_data(file_path, dtype=dtype)
         true_graph = create_true_graph_student()
         output_dir = r'C:\Users\adams\OneDrive\Desktop\causal test\student_DAGS'
     elif dataset == 'adult':
         file_path = r'C:\Users\adams\OneDrive\Desktop\causal test\data\adult_cleaned.csv'
-        df_encoded, labels, data = load_and_prepare_adult_data(file_path)
+        df_encoded, labels, data = load_and_prepare_adult_data(file_path, dtype=dtype)
         true_graph = create_true_graph_adult()
         output_dir = r'C:\Users\adams\OneDrive\Desktop\causal test\adult_DAGS'
     else:
@@ -85,4 +119,4 @@ if __name__ == "__main__":
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    grid_search_pc(data, labels, true_graph, output_dir)
+    grid_search_pc(data, labels, true_graph, output_dir, indep_test=indep_test, executor=executor, dtype=dtype)
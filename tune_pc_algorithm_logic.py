@@ -53,6 +53,8 @@ def run_pc_algorithm(data, labels, output_dir):
 
         # Run PC algorithm
         print(f"Running PC with background knowledge")
+        # causallearn requires a plain ndarray, not the loaders' DataMatrix subclass
+        data = np.asarray(data, dtype=float)
         cg_pc = pc(data, alpha=0.05, indep_test=fisherz, stable=True, uc_rule=0, background_knowledge=bk)
 
         # Convert CausalLearn Graph to NetworkX graph